@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'forge.settings')
 
 application = get_asgi_application()
+
+from users.index import user_index
+
+user_index.warm_in_background()
@@ -0,0 +1,214 @@
+import gzip
+import hashlib
+import os
+import tempfile
+
+from functools import lru_cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+from django.conf import settings
+
+FORMATS = {
+    "json": "application/json",
+    "yaml": "application/yaml",
+}
+
+_documents = {}
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    settings.SCHEMA_VERSION when the build sets one, else a digest of
+    the project sources and the schema libraries, so the spec is only
+    rebuilt when the code that describes it changes
+    """
+    if settings.SCHEMA_VERSION:
+        return settings.SCHEMA_VERSION
+    import django
+    import drf_yasg
+    import rest_framework
+
+    digest = hashlib.sha256()
+    for library in (django, rest_framework, drf_yasg):
+        digest.update(f"{library.__name__}={library.__version__};".encode())
+    for app in settings.SCHEMA_SOURCE_DIRS:
+        for root, dirs, files in os.walk(settings.BASE_DIR / app):
+            dirs[:] = sorted(d for d in dirs if d not in ('migrations', '__pycache__'))
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    path = os.path.join(root, name)
+                    digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+                    with open(path, 'rb') as f:
+                        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def generate_schema():
+    """
+    walks every view and serializer once and returns {format: bytes}
+    """
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+    from drf_yasg import openapi
+
+    generator = OpenAPISchemaGenerator(
+        openapi.Info(
+            title='Auth API',
+            default_version='v1',
+        ),
+    )
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        "json": OpenAPICodecJson(validators=[]).encode(schema),
+        "yaml": OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def compress(body):
+    """
+    {encoding: bytes} precompressed for every encoding available here
+    """
+    encoded = {"gzip": gzip.compress(body, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        encoded["br"] = brotli.compress(body, quality=11)
+    return encoded
+
+
+def schema_dir(version=None):
+    return os.path.join(settings.SCHEMA_ROOT, version or code_version())
+
+
+def write_file(path, content):
+    """
+    atomic so a worker never reads a file another one is writing, and
+    world readable so the web server can serve it directly
+    """
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+        tmp.write(content)
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, path)
+
+
+def build_schema():
+    """
+    generates the spec for the current code version and writes it with
+    its precompressed copies under SCHEMA_ROOT, returns the paths written
+    """
+    directory = schema_dir()
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for format, body in generate_schema().items():
+        path = os.path.join(directory, f"openapi.{format}")
+        write_file(path, body)
+        paths.append(path)
+        for encoding, content in compress(body).items():
+            extension = {"gzip": "gz", "br": "br"}[encoding]
+            write_file(f"{path}.{extension}", content)
+            paths.append(f"{path}.{extension}")
+    return paths
+
+
+def load_document(format):
+    """
+    (etag, {encoding: bytes}) for the current code version, read from
+    the built files or built on the first request, then kept in memory.
+    The etag is unquoted and without its coding suffix
+    """
+    version = code_version()
+    document = _documents.get((version, format))
+    if document is not None:
+        return document
+    path = os.path.join(schema_dir(version), f"openapi.{format}")
+    if not os.path.exists(path):
+        build_schema()
+    with open(path, 'rb') as f:
+        body = f.read()
+    encoded = {"identity": body}
+    for encoding, extension in (("gzip", "gz"), ("br", "br")):
+        if os.path.exists(f"{path}.{extension}"):
+            with open(f"{path}.{extension}", 'rb') as f:
+                encoded[encoding] = f.read()
+    if "gzip" not in encoded:
+        encoded.update(compress(body))
+    etag = f"{version}-{hashlib.sha256(body).hexdigest()[:16]}"
+    document = _documents[(version, format)] = (etag, encoded)
+    return document
+
+
+def parse_accept_encoding(header):
+    """
+    {coding: q} from an Accept-Encoding header, malformed q-values
+    count as refused
+    """
+    weights = {}
+    for value in header.split(','):
+        coding, *params = [part.strip() for part in value.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        if not 0 <= q <= 1:
+            q = 0.0
+        weights[coding.lower()] = q
+    return weights
+
+
+def accepted_encoding(request, encoded):
+    """
+    the available coding the client weights highest, br first on a tie,
+    codings with q=0 are refused and * covers the ones not listed.
+    Falls back to identity, which is always available
+    """
+    weights = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    best, best_q = "identity", 0.0
+    for encoding in ("br", "gzip"):
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if encoding in encoded and q > best_q:
+            best, best_q = encoding, q
+    # identity is only preferred when the client lists it above the others
+    if weights.get('identity', 0.0) > best_q:
+        return "identity"
+    return best
+
+
+def coded_etag(etag, encoding):
+    """
+    each content-coding is a different representation, so it gets its
+    own strong ETag
+    """
+    suffix = {"gzip": "-gz", "br": "-br"}.get(encoding, "")
+    return f'"{etag}{suffix}"'
+
+
+@require_safe
+def schema_document(request, format):
+    """
+    serves the precomputed spec, 304 when the client's ETag matches
+    """
+    etag, encoded = load_document(format)
+    encoding = accepted_encoding(request, encoded)
+    etag = coded_etag(etag, encoding)
+    matches = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in matches or '*' in matches:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(encoded[encoding], content_type=FORMATS[format])
+        if encoding != "identity":
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={settings.SCHEMA_MAX_AGE}"
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -2,11 +2,11 @@ from datetime import timedelta
 from pathlib import Path
 import os, json
 
-with open('config.json') as config_file:
-	config = json.load(config_file)
-
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+with open(BASE_DIR / 'config.json') as config_file:
+	config = json.load(config_file)
+
 SECRET_KEY = config['SECRET_KEY']
 
 AFRICAS_TALKING = config['AFRICAS_TALKING']
@@ -33,8 +33,13 @@ if ON_PRODUCTION:
     CSRF_TRUSTED_ORIGINS = ['https://forge.glitexsolutions.co.ke']
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# daphne's app only swaps in its ASGI runserver but imports twisted as
+# it loads, production workers started with the daphne command set
+# ASGI_RUNSERVER to false in config.json to skip it
+ASGI_RUNSERVER = config.get('ASGI_RUNSERVER', not ON_PRODUCTION)
+
 INSTALLED_APPS = [
-    'daphne',
+    *(['daphne'] if ASGI_RUNSERVER else []),
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,11 +54,13 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'rest_framework',
     'django_filters',
+    'background_task',
 ]
 
 AUTH_USER_MODEL = "users.User"
 
 MIDDLEWARE = [
+    'users.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -105,6 +112,42 @@ else:
         }
     }
 
+# Cache
+if ON_PRODUCTION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+AUTH_USER_CACHE_TIMEOUT = 300
+
+USER_INDEX_MIN_CAPACITY = 100000
+USER_INDEX_ERROR_RATE = 0.01
+USER_INDEX_REFRESH_INTERVAL = 5
+USER_INDEX_WATERMARK_LAG = timedelta(seconds=60)
+
+PASSWORD_HASHERS = [
+    'users.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = 600000
+
+PASSWORD_HASHING_WORKERS = 2
+
+PASSWORD_HASHING_MAX_PENDING = 32
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -142,14 +185,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Rest Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ),
 }
 
 # Email
 if ON_PRODUCTION:
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_BACKEND = 'users.mail.PooledEmailBackend'
     EMAIL_HOST = config['EMAIL_HOST']
     EMAIL_PORT = config['EMAIL_PORT']
     EMAIL_HOST_USER = config['EMAIL_HOST_USER']
@@ -165,4 +208,98 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=7),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=20),
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "users.tokens.VersionedTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.tokens.VersionedTokenRefreshSerializer",
+}
+
+# OTP
+OTP_LIFETIME = timedelta(minutes=10)
+OTP_MAX_ATTEMPTS = 10
+
+# Background tasks
+MAX_ATTEMPTS = 6
+
+# SMS
+PHONE_REGION_CODE = '254'
+SMS_PROVIDER = 'users.sms.AfricasTalkingProvider'
+SMS_USERNAME = 'glitex'
+SMS_SENDER_ID = 'Glitex'
+SMS_TIMEOUT = 10
+SMS_BATCH_WINDOW = 2
+SMS_BATCH_SIZE = 100
+
+# Notifications
+EMAIL_BATCH_WINDOW = 1
+EMAIL_BATCH_SIZE = 50
+EMAIL_POOL_SIZE = 4
+EMAIL_POOL_MAX_IDLE = 60
+EMAIL_POOL_TIMEOUT = 10
+NOTIFICATION_DISPATCH_LIMIT = 1000
+NOTIFICATION_CLAIM_TIMEOUT = 300
+
+# Images
+IMAGE_VARIANT_SIZES = (64, 256, 1024)
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = 80
+
+# Uploads
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+CHUNKED_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_CHUNK = 8 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY = timedelta(days=1)
+
+# Nearby users
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_PAGE_SIZE = 20
+NEARBY_MAX_PAGE_SIZE = 100
+
+# Geocoding
+GEOCODER = 'users.geocoding.NominatimGeocoder'
+GEOCODER_USER_AGENT = 'forge'
+GEOCODER_TIMEOUT = 10
+GEOCODE_PRECISION = 4
+GEOCODE_CACHE_SIZE = 100000
+GEOCODE_RATE_LIMIT = 1
+GEOCODE_BATCH_SIZE = 50
+GEOCODE_BATCH_WINDOW = 5
+GEOCODE_RETRY_DELAY = 300
+GEOCODE_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# Rate limiting, (requests, window seconds) per client ip, request
+# field or globally for each throttle scope. Behind proxies the client
+# ip is read from X-Forwarded-For, one hop per proxy from the end,
+# otherwise every client shares the proxy's bucket
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_PROXY_COUNT = config.get('RATE_LIMIT_PROXY_COUNT', 1 if ON_PRODUCTION else 0)
+RATE_LIMITS = {
+    'register': {'ip': (20, 3600), 'email': (3, 3600)},
+    'register-phonenumber': {'ip': (20, 3600), 'phone_number': (3, 3600)},
+    'otp-resend': {'ip': (20, 3600), 'email': (3, 600)},
+    'otp-phone-resend': {'ip': (20, 3600), 'phone_number': (3, 600)},
+    'otp-confirm': {'ip': (30, 600), 'global': (6000, 60)},
+    'otp-set-password': {'ip': (10, 600), 'global': (3000, 60)},
 }
+
+# Staff listings
+STAFF_PAGE_SIZE = 50
+STAFF_MAX_PAGE_SIZE = 500
+
+# Admin
+ADMIN_EXACT_COUNT_LIMIT = 10000
+ADMIN_ACTION_BATCH_SIZE = 1000
+
+# OpenAPI schema
+SCHEMA_VERSION = config.get('SCHEMA_VERSION')
+SCHEMA_SOURCE_DIRS = ('forge', 'users')
+SCHEMA_ROOT = os.path.join(BASE_DIR, "schema")
+SCHEMA_MAX_AGE = 3600
+SCHEMA_UI_CACHE_TIMEOUT = 86400
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('openapi-schema', {'format': 'json'}),
+}
+
+# Metrics
+METRICS_SLOW_QUERY_MS = 100
+METRICS_SLOW_QUERY_SAMPLE_RATE = 0.01
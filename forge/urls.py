@@ -1,24 +1,47 @@
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.conf import settings
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
 
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+from functools import lru_cache
+
+from .schema import code_version, schema_document
+
+
+@lru_cache(maxsize=None)
+def swagger_view():
+    """
+    builds the drf_yasg view on the first docs request, keeping drf_yasg
+    and its dependencies off worker and manage.py startup. The page
+    loads its spec from the precomputed schema and is itself cached
+    per code version
+    """
+    from rest_framework import permissions
+    from drf_yasg.views import get_schema_view
+    from drf_yasg import openapi
+
+    schema_view = get_schema_view(
+        openapi.Info(
+            title='Auth API',
+            default_version='v1',
+        ),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.with_ui(
+        'swagger',
+        cache_timeout=settings.SCHEMA_UI_CACHE_TIMEOUT,
+        cache_kwargs={'key_prefix': f"openapi:{code_version()}"}
+    )
+
+
+def swagger_ui(request, *args, **kwargs):
+    return swagger_view()(request, *args, **kwargs)
 
-schema_view = get_schema_view(
-    openapi.Info(
-        title='Auth API',
-        default_version='v1',
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
 API = 'api/v1'
 
@@ -26,9 +49,14 @@ urlpatterns = [
     path('fhnxtydslt/admin/', admin.site.urls),
     path(
         f'{API}/docs/', 
-        schema_view.with_ui('swagger', cache_timeout=0), 
+        swagger_ui, 
         name='schema-swagger-ui'
     ),
+    re_path(
+        rf'^{API}/schema\.(?P<format>json|yaml)$',
+        schema_document,
+        name='openapi-schema'
+    ),
     path(
         f'{API}/auth/token/', 
         TokenObtainPairView.as_view(), 
@@ -1,7 +1,13 @@
 from django.contrib import admin
 from django.contrib.admin import AdminSite
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from django.db.models import Max
+from django.utils import timezone
+from django.db import connections
 from django.conf import settings
 
+from .cache import invalidate_cached_users
 from .models import *
 
 name = settings.SITE_NAME
@@ -9,5 +15,118 @@ name = settings.SITE_NAME
 AdminSite.site_title = f'{name}'
 AdminSite.site_header = f'{name} Admin Panel'
 
-admin.site.register(User)
-admin.site.register(Profile)
\ No newline at end of file
+
+def estimate_table_rows(model, using='default'):
+    """
+    row count from the database statistics instead of a COUNT(*) scan,
+    None when the backend keeps none
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [table]
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        return model._default_manager.using(using).aggregate(estimate=Max('pk'))['estimate']
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    counts exactly up to ADMIN_EXACT_COUNT_LIMIT rows and estimates
+    beyond that, so a changelist never counts a large table in full
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        count = queryset.order_by()[:limit + 1].count()
+        if count <= limit:
+            return count
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate:
+                return max(estimate, count)
+        return count
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+def update_users(modeladmin, request, queryset, **values):
+    """
+    applies values to the selected users a batch of ADMIN_ACTION_BATCH_SIZE
+    ids at a time, walking the selection by id so memory stays flat
+    however many are selected, and moves each batch to a new auth cache
+    generation, which post_save would otherwise do
+    """
+    selected = queryset.order_by('pk').values_list('pk', flat=True)
+    batch_size = settings.ADMIN_ACTION_BATCH_SIZE
+    updated = 0
+    last = None
+    while True:
+        batch = selected if last is None else selected.filter(pk__gt=last)
+        ids = list(batch[:batch_size])
+        if not ids:
+            break
+        updated += User.objects.filter(pk__in=ids).update(last_updated_time=timezone.now(), **values)
+        invalidate_cached_users(ids)
+        last = ids[-1]
+    modeladmin.message_user(request, f"Updated {updated} users")
+
+
+@admin.action(description="Activate selected users")
+def activate_users(modeladmin, request, queryset):
+    update_users(modeladmin, request, queryset, is_active=True)
+
+
+@admin.action(description="Deactivate selected users")
+def deactivate_users(modeladmin, request, queryset):
+    update_users(modeladmin, request, queryset, is_active=False)
+
+
+@admin.register(User)
+class UserAdmin(ScalableAdmin):
+    list_display = ('email', 'full_name', 'phone_number', 'is_active', 'is_admin', 'creation_time')
+    list_filter = ('is_active', 'is_admin', 'phone_otp_registration')
+    search_fields = ('^email', '^phone_number')
+    ordering = ('-creation_time', '-id')
+    raw_id_fields = ('image_asset',)
+    readonly_fields = ('last_login', 'creation_time', 'last_updated_time')
+    actions = [activate_users, deactivate_users]
+
+
+@admin.register(Profile)
+class ProfileAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'document', 'creation_time')
+    list_select_related = ('user',)
+    search_fields = ('^user__email',)
+    ordering = ('-creation_time', '-id')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(ScalableAdmin):
+    list_display = ('id', 'channel', 'recipient', 'status', 'attempts', 'creation_time')
+    list_filter = ('channel', 'status')
+    search_fields = ('^recipient',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(ImageAsset)
+class ImageAssetAdmin(ScalableAdmin):
+    list_display = ('digest', 'original', 'creation_time')
+    search_fields = ('^digest',)
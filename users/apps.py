@@ -1,6 +1,11 @@
+from django.db.backends.signals import connection_created
 from django.apps import AppConfig
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from .metrics import install_query_wrapper
+        connection_created.connect(install_query_wrapper)
@@ -0,0 +1,172 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.db import IntegrityError
+from django.views import View
+
+from .serializers import EmailCheckSerializer, OtpCodeSerializer, SetUserPasswordSerializer, UserReadSerializer
+from .utils import OtpUnavailable, aconsume_user_otp, aemail_exists, aotp_exists
+from .hashing import HashingOverloaded, amake_password
+from .services import register_user
+from .throttling import acheck_rate_limit
+from .tokens import VersionedRefreshToken
+
+
+class AsyncApiView(View):
+    """
+    base for the native async endpoints, csrf exempt like DRF views and
+    limited to POST with JSON or form bodies
+    """
+    http_method_names = ['post', 'options']
+    serializer_class = None
+    throttle_scope = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.throttle_scope is not None and request.method == 'POST':
+            wait = await acheck_rate_limit(self.throttle_scope, request, self.get_data(request) or {})
+            if wait is not None:
+                data = {
+                    "detail": f"Request was throttled. Expected available in {wait} seconds."
+                }
+                response = JsonResponse(data, status=429)
+                response['Retry-After'] = wait
+                return response
+        return await super().dispatch(request, *args, **kwargs)
+
+    def get_data(self, request):
+        if not hasattr(request, '_parsed_data'):
+            request._parsed_data = self.parse_data(request)
+        return request._parsed_data
+
+    def parse_data(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+        return request.POST
+
+    def get_serializer(self, request):
+        data = self.get_data(request)
+        if data is None:
+            return None
+        return self.serializer_class(data=data)
+
+    def bad_request(self, errors):
+        return JsonResponse(errors, status=400)
+
+
+class AsyncRegisterUserApiView(AsyncApiView):
+    """
+    registers a user to the platform
+    """
+    serializer_class = EmailCheckSerializer
+    throttle_scope = 'register'
+
+    async def post(self, request):
+        serializer = self.get_serializer(request)
+        if serializer is None:
+            return self.bad_request({"detail": "JSON parse error"})
+        if not serializer.is_valid():
+            return self.bad_request(serializer.errors)
+        email = serializer.validated_data['email']
+        if await aemail_exists(email):
+            return self.bad_request({"email": ["This field must be unique."]})
+        try:
+            user, otp = await sync_to_async(register_user)(email)
+        except IntegrityError:
+            return self.bad_request({"email": ["This field must be unique."]})
+        except OtpUnavailable as e:
+            return JsonResponse({"detail": e.detail}, status=e.status_code)
+        data = {
+            "message": "User created successfully",
+            "otp": otp
+        }
+        return JsonResponse(data)
+
+
+class AsyncConfirmOtpApiView(AsyncApiView):
+    """
+    confirms a users OTP
+    """
+    serializer_class = OtpCodeSerializer
+    throttle_scope = 'otp-confirm'
+
+    async def post(self, request):
+        serializer = self.get_serializer(request)
+        if serializer is None:
+            return self.bad_request({"detail": "JSON parse error"})
+        if not serializer.is_valid():
+            return self.bad_request(serializer.errors)
+        if not await aotp_exists(serializer.validated_data['otp_code']):
+            return self.bad_request({"otp_code": ["OTP code entered does not exist."]})
+        data = {
+            "message": "OTP code confirmed successfully",
+            "exists": True
+        }
+        return JsonResponse(data)
+
+
+class AsyncSetUserPasswordApiView(AsyncApiView):
+    """
+    sets the user password and returns JWT token
+    """
+    serializer_class = SetUserPasswordSerializer
+    throttle_scope = 'otp-set-password'
+
+    async def post(self, request):
+        serializer = self.get_serializer(request)
+        if serializer is None:
+            return self.bad_request({"detail": "JSON parse error"})
+        if not serializer.is_valid():
+            return self.bad_request(serializer.errors)
+        otp_code = serializer.validated_data['otp_code']
+        if not await aotp_exists(otp_code):
+            return self.bad_request({"otp_code": ["OTP code entered does not exist."]})
+        # hash before burning the code, a request shed by a busy pool
+        # leaves the OTP usable for a retry
+        try:
+            password = await amake_password(serializer.validated_data['password'])
+        except HashingOverloaded as e:
+            return JsonResponse({"detail": e.detail}, status=e.status_code)
+        user = await aconsume_user_otp(otp_code)
+        if user is None:
+            return self.bad_request({"otp_code": ["OTP code entered does not exist."]})
+        user.password = password
+        await user.asave(update_fields=['password', 'last_updated_time'])
+        await user.arevoke_tokens()
+        refresh_token = VersionedRefreshToken.for_user(user)
+        data = {
+            "message": "Password set successfully",
+            "user": UserReadSerializer(user).data,
+            "refresh": f"{refresh_token}",
+            "access": f"{refresh_token.access_token}"
+        }
+        return JsonResponse(data)
+
+
+class AsyncEmailCheckApiView(AsyncApiView):
+    """
+    checks if an email exist
+    """
+    serializer_class = EmailCheckSerializer
+
+    async def post(self, request):
+        serializer = self.get_serializer(request)
+        if serializer is None:
+            return self.bad_request({"detail": "JSON parse error"})
+        if not serializer.is_valid():
+            return self.bad_request(serializer.errors)
+        exists = await aemail_exists(serializer.validated_data['email'])
+        data = {
+            "message": "Email Confirmed Successfully",
+            "exists": exists
+        }
+        return JsonResponse(data)
@@ -0,0 +1,261 @@
+import asyncio
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError
+from django.urls import path
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+
+from .async_views import *
+from .geo import encode_geohash
+from .services import register_user
+from .throttling import SharedCacheRateThrottle
+from .tokens import VersionedRefreshToken
+from .utils import create_user_otp, email_exists
+from .views import *
+
+BENCH_PASSWORD = "Bench-password-1"
+SCENARIO_BLOCKS = 6
+
+
+class SyncRegisterApiView(GenericAPIView):
+    """
+    DRF baseline for AsyncRegisterUserApiView, only routed by bench_views
+    """
+    serializer_class = RegistrationSerializer
+    throttle_classes = [SharedCacheRateThrottle]
+    throttle_scope = 'register'
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            user, otp = register_user(serializer.validated_data['email'])
+        except IntegrityError:
+            return Response({"email": ["This field must be unique."]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message": "User created successfully", "otp": otp})
+
+
+class SyncConfirmOtpApiView(GenericAPIView):
+    """
+    DRF baseline for AsyncConfirmOtpApiView
+    """
+    serializer_class = OtpConfirmationSerializer
+    throttle_classes = [SharedCacheRateThrottle]
+    throttle_scope = 'otp-confirm'
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message": "OTP code confirmed successfully", "exists": True})
+
+
+class SyncEmailCheckApiView(GenericAPIView):
+    """
+    DRF baseline for AsyncEmailCheckApiView
+    """
+    serializer_class = EmailCheckSerializer
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        exists = email_exists(serializer.validated_data['email'])
+        return Response({"message": "Email Confirmed Successfully", "exists": exists})
+
+
+urlpatterns = [
+    path('sync/register/', SyncRegisterApiView.as_view()),
+    path('sync/otp/confirm/', SyncConfirmOtpApiView.as_view()),
+    path('sync/email/check/', SyncEmailCheckApiView.as_view()),
+    path('async/register/', AsyncRegisterUserApiView.as_view()),
+    path('async/otp/confirm/', AsyncConfirmOtpApiView.as_view()),
+    path('async/email/check/', AsyncEmailCheckApiView.as_view()),
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = round(pct / 100 * (len(ordered) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    """
+    throughput and latency percentiles in milliseconds for one run
+    """
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50) * 1000,
+        "p95": percentile(latencies, 95) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+    }
+
+
+async def drive(client, requests, concurrency):
+    """
+    sends every (method, path, data, headers) request from concurrency
+    workers sharing one event loop and returns the per request
+    latencies, the wall time and how many responses were errors
+    """
+    pending = list(reversed(requests))
+    latencies = []
+    errors = []
+
+    async def worker():
+        while pending:
+            method, path, data, headers = pending.pop()
+            start = time.perf_counter()
+            if method == 'get':
+                response = await client.get(path, data, headers=headers)
+            else:
+                response = await getattr(client, method)(path, data, content_type='application/json', headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start, len(errors)
+
+
+def seed_users(count, batch_size=5000):
+    """
+    bulk inserts count users sharing the BENCH_PASSWORD hash, with
+    profiles, phone numbers and locations on a grid around Nairobi,
+    nothing is kept in memory past a batch so large tables seed in
+    constant memory
+    """
+    password = make_password(BENCH_PASSWORD)
+    for start in range(0, count, batch_size):
+        users = []
+        for i in range(start, min(start + batch_size, count)):
+            latitude = -1.2921 + i % 100 * 0.001
+            longitude = 36.8219 + i // 100 % 100 * 0.001
+            users.append(User(
+                email=f"seed{i}@bench.forge.com",
+                phone_number=f"+2547{i:08d}",
+                password=password,
+                latitude=latitude,
+                longitude=longitude,
+                geohash=encode_geohash(latitude, longitude)
+            ))
+        User.objects.bulk_create(users)
+        emails = [user.email for user in users]
+        ids = User.objects.filter(email__in=emails).values_list('id', flat=True)
+        Profile.objects.bulk_create([Profile(user_id=id) for id in ids])
+
+
+def scenario_users(requests):
+    """
+    the first seeded users, one block of requests users per scenario
+    that needs its own
+    """
+    return list(
+        User.objects.filter(email__endswith="@bench.forge.com", email__startswith="seed")
+        .order_by('id').select_related('profile')[:SCENARIO_BLOCKS * requests]
+    )
+
+
+def build_scenarios(users, admin, requests):
+    """
+    returns the requests to send per route name, routes that change or
+    consume state get their own block of seeded users
+    """
+    blocks = [users[i * requests:(i + 1) * requests] for i in range(SCENARIO_BLOCKS)]
+    readers, changers, deleters, otp_users, token_users, resenders = blocks
+
+    def bearer(user):
+        return {"authorization": f"Bearer {VersionedRefreshToken.for_user(user).access_token}"}
+
+    otps = [create_user_otp(user) for user in otp_users]
+    admin_headers = bearer(admin)
+    refresh_tokens = [f"{VersionedRefreshToken.for_user(user)}" for user in token_users]
+    api = '/api/v1/users'
+    return {
+        "register": [
+            ('post', f'{api}/register/', {"email": f"new{i}@bench.forge.com"}, {})
+            for i in range(requests)
+        ],
+        "register-phonenumber": [
+            ('post', f'{api}/register/phonenumber/', {"phone_number": f"+2541{i:08d}"}, {})
+            for i in range(requests)
+        ],
+        "otp-confirm": [
+            ('post', f'{api}/otp/confirm/', {"otp_code": otp}, {})
+            for otp in otps
+        ],
+        "otp-resend": [
+            ('post', f'{api}/otp/resend/', {"email": user.email}, {})
+            for user in resenders
+        ],
+        "otp-phone-resend": [
+            ('post', f'{api}/otp/phone/resend/', {"phone_number": user.phone_number}, {})
+            for user in resenders
+        ],
+        "otp-set-password": [
+            ('post', f'{api}/otp/set/password/', {"otp_code": otp, "password": BENCH_PASSWORD, "password2": BENCH_PASSWORD}, {})
+            for otp in otps
+        ],
+        "user": [
+            ('get', f'{api}/user/', None, bearer(user))
+            for user in readers
+        ],
+        "user-patch": [
+            ('patch', f'{api}/user/', {"full_name": f"Bench {i}"}, bearer(user))
+            for i, user in enumerate(readers)
+        ],
+        "user-nearby": [
+            ('get', f'{api}/user/nearby/', None, bearer(user))
+            for user in readers
+        ],
+        "user-delete": [
+            ('delete', f'{api}/user/', None, bearer(user))
+            for user in deleters
+        ],
+        "user-password-change": [
+            ('post', f'{api}/user/password/change/', {"old_password": BENCH_PASSWORD, "password": f"{BENCH_PASSWORD}x", "password2": f"{BENCH_PASSWORD}x"}, bearer(user))
+            for user in changers
+        ],
+        "profile": [
+            ('get', f'{api}/user/profile/', None, bearer(user))
+            for user in readers
+        ],
+        "profile-modify": [
+            ('patch', f'{api}/user/profile/modify/{user.profile.id}/', {}, bearer(user))
+            for user in readers
+        ],
+        "email-check": [
+            ('post', f'{api}/email/check/', {"email": f"seed{i * 7}@bench.forge.com" if i % 2 else f"missing{i}@bench.forge.com"}, {})
+            for i in range(requests)
+        ],
+        "staff-users": [
+            ('get', f'{api}/staff/users/', None, admin_headers)
+            for _ in range(requests)
+        ],
+        "staff-profiles": [
+            ('get', f'{api}/staff/profiles/', None, admin_headers)
+            for _ in range(requests)
+        ],
+        "metrics": [
+            ('get', f'{api}/metrics/', None, admin_headers)
+            for _ in range(requests)
+        ],
+        "metrics-slow-queries": [
+            ('get', f'{api}/metrics/slow/', None, admin_headers)
+            for _ in range(requests)
+        ],
+        "token_obtain_pair": [
+            ('post', '/api/v1/auth/token/', {"email": user.email, "password": BENCH_PASSWORD}, {})
+            for user in token_users
+        ],
+        "token_refresh": [
+            ('post', '/api/v1/auth/token/refresh/', {"refresh": token}, {})
+            for token in refresh_tokens
+        ],
+    }
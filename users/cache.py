@@ -0,0 +1,47 @@
+import time
+
+from django.core.cache import cache
+from django.conf import settings
+
+
+def user_generation_key(user_id):
+    return f"users:auth:generation:{user_id}"
+
+
+def get_cached_user(user_id):
+    """
+    returns the cached user for an id, or None, along with the cache
+    generation the lookup was made under
+    """
+    generation = cache.get(user_generation_key(user_id), 0)
+    user = cache.get(f"users:auth:{user_id}:{generation}")
+    return user, generation
+
+
+def set_cached_user(user, generation):
+    cache.set(
+        f"users:auth:{user.pk}:{generation}",
+        user,
+        settings.AUTH_USER_CACHE_TIMEOUT
+    )
+
+
+def invalidate_cached_user(user_id):
+    """
+    moves the user to a new cache generation so entries written under
+    the old one, including ones racing with this call, are never read
+    """
+    key = user_generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def invalidate_cached_users(user_ids):
+    """
+    bulk form of invalidate_cached_user for update() calls that skip
+    post_save, a fresh generation needs no read so it is one round trip
+    """
+    generation = time.time_ns()
+    cache.set_many({user_generation_key(user_id): generation for user_id in user_ids}, None)
@@ -0,0 +1,32 @@
+import django_filters
+
+from django.db.models import Q
+
+from .models import Profile, User
+
+
+class UserFilter(django_filters.FilterSet):
+    email = django_filters.CharFilter(field_name='email', lookup_expr='startswith')
+    phone_number = django_filters.CharFilter(field_name='phone_number', lookup_expr='startswith')
+    created_after = django_filters.IsoDateTimeFilter(field_name='creation_time', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='creation_time', lookup_expr='lt')
+
+    class Meta:
+        model = User
+        fields = ['email', 'phone_number', 'gender', 'is_active', 'is_admin', 'phone_otp_registration']
+
+
+class ProfileFilter(django_filters.FilterSet):
+    email = django_filters.CharFilter(field_name='user__email', lookup_expr='startswith')
+    has_document = django_filters.BooleanFilter(method='filter_has_document')
+    created_after = django_filters.IsoDateTimeFilter(field_name='creation_time', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='creation_time', lookup_expr='lt')
+
+    class Meta:
+        model = Profile
+        fields = ['user', 'email']
+
+    def filter_has_document(self, queryset, name, value):
+        if value:
+            return queryset.exclude(document='').exclude(document=None)
+        return queryset.filter(Q(document='') | Q(document=None))
@@ -0,0 +1,100 @@
+import math
+
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+GEOHASH_PRECISION = 12
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    standard base32 geohash, nearby points share a prefix so a prefix
+    is an index range covering one grid cell
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(geohash) < precision:
+        if even:
+            value, bounds = longitude, lon_range
+        else:
+            value, bounds = latitude, lat_range
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(geohash)
+
+
+def cell_size(precision):
+    """
+    height and width in degrees of a geohash cell at a precision
+    """
+    lat_bits = 5 * precision // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    great circle distance in kilometres
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    (min_lat, max_lat, min_lon, max_lon) containing every point within
+    radius_km, longitudes widen to the full range near the poles and
+    across the antimeridian
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat = max(-90.0, latitude - lat_delta)
+    max_lat = min(90.0, latitude + lat_delta)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 0:
+        return min_lat, max_lat, -180.0, 180.0
+    lon_delta = lat_delta / cos_lat
+    if lon_delta >= 180 or longitude - lon_delta < -180 or longitude + lon_delta > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, longitude - lon_delta, longitude + lon_delta
+
+
+def covering_cells(box, max_cells=16):
+    """
+    geohash prefixes whose cells together cover the bounding box, using
+    the longest prefix that needs at most max_cells cells so the index
+    ranges hug the box without turning into a long OR
+    """
+    min_lat, max_lat, min_lon, max_lon = box
+    cells = [""]
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = int(max_lat // height) - int(min_lat // height) + 1
+        columns = int(max_lon // width) - int(min_lon // width) + 1
+        if rows * columns > max_cells:
+            break
+        cells = sorted({
+            encode_geohash(min(max_lat, min_lat + row * height), min(max_lon, min_lon + column * width), precision)
+            for row in range(rows)
+            for column in range(columns)
+        })
+    return cells
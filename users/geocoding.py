@@ -0,0 +1,159 @@
+from django.utils.module_loading import import_string
+from django.db.models import Q
+from django.db import transaction
+from django.utils import timezone
+from django.conf import settings
+
+from .cache import invalidate_cached_user
+from .metrics import track_provider
+from .models import GeocodeCache, User
+from .throttling import acquire_rate_slot
+
+_geocoder = None
+
+
+def get_geocoder():
+    """
+    returns the process wide reverse geocoder named by settings.GEOCODER
+    """
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = import_string(settings.GEOCODER)()
+    return _geocoder
+
+
+class NominatimGeocoder:
+    """
+    reverse geocodes through geopy's Nominatim client, every call and
+    retry waits for a slot of GEOCODE_RATE_LIMIT shared by all workers
+    to respect the provider's usage policy
+    """
+    def __init__(self):
+        from geopy.extra.rate_limiter import RateLimiter
+        from geopy.geocoders import Nominatim
+
+        self.client = Nominatim(
+            user_agent=settings.GEOCODER_USER_AGENT,
+            timeout=settings.GEOCODER_TIMEOUT
+        )
+        self.limited_reverse = RateLimiter(
+            self.shared_reverse,
+            min_delay_seconds=0,
+            max_retries=2
+        )
+
+    def shared_reverse(self, *args, **kwargs):
+        acquire_rate_slot("geocoder", settings.GEOCODE_RATE_LIMIT)
+        return self.client.reverse(*args, **kwargs)
+
+    def reverse(self, latitude, longitude):
+        location = self.limited_reverse((latitude, longitude), exactly_one=True)
+        if location is None:
+            return None
+        return location.address[:255]
+
+
+class FakeGeocoder:
+    """
+    offline geocoder for tests, records every lookup in calls and
+    answers with a deterministic address
+    """
+    calls = []
+
+    def reverse(self, latitude, longitude):
+        self.calls.append((latitude, longitude))
+        return f"Near {latitude}, {longitude}"
+
+
+def cache_key(latitude, longitude):
+    precision = settings.GEOCODE_PRECISION
+    return f"{latitude:.{precision}f},{longitude:.{precision}f}"
+
+
+def evict_geocode_cache():
+    """
+    deletes the least recently used entries beyond GEOCODE_CACHE_SIZE
+    """
+    excess = GeocodeCache.objects.count() - settings.GEOCODE_CACHE_SIZE
+    if excess <= 0:
+        return 0
+    keys = list(GeocodeCache.objects.order_by('last_used_time').values_list('key', flat=True)[:excess])
+    return GeocodeCache.objects.filter(key__in=keys).delete()[0]
+
+
+def claim_pending_users(limit):
+    """
+    marks up to limit users waiting for an address as claimed and
+    commits, so concurrent workers take different users and no lock is
+    held while the geocoder is called. Claims older than
+    GEOCODE_CLAIM_TIMEOUT belong to a worker that died and are taken over
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            User.objects.select_for_update(skip_locked=True).filter(
+                Q(geocode_claim_time__isnull=True)
+                | Q(geocode_claim_time__lt=now - settings.GEOCODE_CLAIM_TIMEOUT),
+                geocode_pending=True
+            ).order_by().values_list('id', flat=True)[:limit]
+        )
+        User.objects.filter(id__in=ids).update(geocode_claim_time=now)
+    return list(
+        User.objects.filter(id__in=ids).values_list('id', 'latitude', 'longitude', 'geohash')
+    )
+
+
+def geocode_batch(limit=None):
+    """
+    fills in the address of up to limit users waiting for one. Their
+    coordinates are rounded to GEOCODE_PRECISION, repeats are served
+    from GeocodeCache and only misses reach the geocoder. A user that
+    moved again meanwhile, or whose lookup failed, is released for the
+    next batch. Returns how many users were looked at and how many
+    lookups failed
+    """
+    limit = limit or settings.GEOCODE_BATCH_SIZE
+    users = claim_pending_users(limit)
+    if not users:
+        return 0, 0
+    keys = {id: cache_key(lat, lon) for id, lat, lon, _ in users}
+    now = timezone.now()
+    addresses = {
+        key: entry.address
+        for key, entry in GeocodeCache.objects.in_bulk(set(keys.values())).items()
+    }
+    GeocodeCache.objects.filter(key__in=list(addresses)).update(last_used_time=now)
+
+    misses = set(keys.values()) - set(addresses)
+    failed = set()
+    entries = []
+    geocoder = get_geocoder()
+    for key in sorted(misses):
+        latitude, longitude = map(float, key.split(","))
+        try:
+            with track_provider("geocoder"):
+                address = geocoder.reverse(latitude, longitude)
+        except Exception:
+            failed.add(key)
+            continue
+        # places without an address are cached too, as an empty string
+        addresses[key] = address or ""
+        entries.append(GeocodeCache(key=key, address=addresses[key], last_used_time=now))
+    GeocodeCache.objects.bulk_create(entries, ignore_conflicts=True)
+
+    for id, _, _, geohash in users:
+        key = keys[id]
+        if key in failed:
+            continue
+        updated = User.objects.filter(id=id, geohash=geohash).update(
+            formater_address=addresses[key] or None,
+            geocode_pending=False,
+            geocode_claim_time=None,
+            last_updated_time=now
+        )
+        if updated:
+            invalidate_cached_user(id)
+    User.objects.filter(id__in=list(keys), geocode_pending=True).update(geocode_claim_time=None)
+    if entries:
+        evict_geocode_cache()
+    return len(users), len(failed)
@@ -0,0 +1,12 @@
+from django.contrib.auth import hashers
+from django.conf import settings
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from PASSWORD_HASH_ITERATIONS,
+    hashes made with another count are upgraded on the next login
+    """
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
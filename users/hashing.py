@@ -0,0 +1,96 @@
+import multiprocessing
+import threading
+import asyncio
+
+from concurrent.futures import ProcessPoolExecutor
+from rest_framework.exceptions import APIException
+from django.contrib.auth import hashers
+from django.conf import settings
+import django
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class HashingOverloaded(APIException):
+    status_code = 503
+    default_detail = "Server is busy, try again shortly."
+    default_code = "hashing_overloaded"
+
+
+def _init_worker(iterations):
+    """
+    workers load settings afresh, the iteration count is handed over so
+    they hash exactly like the process that started them
+    """
+    django.setup()
+    settings.PASSWORD_HASH_ITERATIONS = iterations
+
+
+def _get_executor():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = settings.PASSWORD_HASHING_WORKERS
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(settings.PASSWORD_HASH_ITERATIONS,)
+            )
+            _slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHING_MAX_PENDING)
+        return _executor, _slots
+
+
+def _submit(fn, *args):
+    """
+    queues fn on the hashing pool, shedding the call with
+    HashingOverloaded once PASSWORD_HASHING_MAX_PENDING are waiting
+    """
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        raise HashingOverloaded()
+    future = executor.submit(fn, *args)
+    future.add_done_callback(lambda f: slots.release())
+    return future
+
+
+def _needs_rehash(encoded):
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def make_password(password):
+    if password is None or not settings.PASSWORD_HASHING_WORKERS:
+        return hashers.make_password(password)
+    return _submit(hashers.make_password, password).result()
+
+
+def check_password(password, encoded, setter=None):
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return hashers.check_password(password, encoded, setter)
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+    valid = _submit(hashers.check_password, password, encoded).result()
+    if valid and setter and _needs_rehash(encoded):
+        setter(password)
+    return valid
+
+
+async def amake_password(password):
+    if password is None or not settings.PASSWORD_HASHING_WORKERS:
+        return hashers.make_password(password)
+    return await asyncio.wrap_future(_submit(hashers.make_password, password))
+
+
+async def acheck_password(password, encoded):
+    if not settings.PASSWORD_HASHING_WORKERS:
+        return hashers.check_password(password, encoded)
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+    return await asyncio.wrap_future(_submit(hashers.check_password, password, encoded))
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import tempfile
+
+from io import BytesIO
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import ImageAsset
+
+
+FORMATS = {
+    "webp": ("WEBP", {"method": 4}),
+    "jpeg": ("JPEG", {"optimize": True, "progressive": True}),
+}
+
+
+def store_image(upload):
+    """
+    streams an upload to temporary storage while hashing it and returns
+    the ImageAsset for its content, new content is saved once and handed
+    to the variant worker after the transaction commits
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False) as tmp:
+        for chunk in upload.chunks():
+            digest.update(chunk)
+            tmp.write(chunk)
+    key = digest.hexdigest()
+    try:
+        asset = ImageAsset.objects.filter(digest=key).first()
+        if asset is not None:
+            return asset
+        extension = os.path.splitext(upload.name)[1].lower()
+        with open(tmp.name, 'rb') as f:
+            name = default_storage.save(f"users/originals/{key[:2]}/{key}{extension}", File(f))
+        try:
+            with transaction.atomic():
+                asset = ImageAsset.objects.create(digest=key, original=name)
+        except IntegrityError:
+            # the same content was stored concurrently, keep that copy
+            default_storage.delete(name)
+            return ImageAsset.objects.get(digest=key)
+        from .tasks import process_image
+        transaction.on_commit(lambda: process_image(key))
+        return asset
+    finally:
+        os.unlink(tmp.name)
+
+
+def variant_name(digest, size, extension):
+    return f"users/variants/{digest[:2]}/{digest}/{size}.{extension}"
+
+
+def build_variants(asset):
+    """
+    resizes and recompresses the original into every configured size
+    and format, returns {size: {format: stored name}}
+    """
+    from PIL import Image, ImageOps
+
+    variants = {}
+    with asset.original.open('rb') as f:
+        source = ImageOps.exif_transpose(Image.open(f))
+        source = source.convert("RGB")
+    for size in settings.IMAGE_VARIANT_SIZES:
+        image = source.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        variants[str(size)] = {}
+        for extension in settings.IMAGE_VARIANT_FORMATS:
+            format, options = FORMATS[extension]
+            buffer = BytesIO()
+            image.save(buffer, format, quality=settings.IMAGE_VARIANT_QUALITY, **options)
+            name = variant_name(asset.digest, size, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[str(size)][extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import csv
+import os
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import close_old_connections
+
+from .phone import normalize_phone_number
+from .models import GENDER, Profile, User
+
+GENDERS = {choice for choice, _ in GENDER}
+
+
+class InvalidRow:
+    """
+    stands in for a line that could not be parsed into a row
+    """
+    def __init__(self, error):
+        self.error = error
+
+
+def read_rows(path, format):
+    """
+    streams dict rows from a CSV file with a header line or a JSONL file,
+    a JSONL line that is not an object comes through as an InvalidRow so
+    it is counted as invalid in its chunk
+    """
+    with open(path, newline='') as source:
+        if format == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for number, line in enumerate(source, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield InvalidRow(f"line {number}: malformed JSON, {e}")
+                    continue
+                if not isinstance(row, dict):
+                    yield InvalidRow(f"line {number}: not a JSON object")
+                    continue
+                yield row
+
+
+def file_fingerprint(path):
+    """
+    size plus a digest of the first MiB, enough to tell a checkpoint was
+    written for another file without reading a large one in full
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        digest.update(source.read(1 << 20))
+    return f"{os.path.getsize(path)}:{digest.hexdigest()}"
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_user(row):
+    """
+    validates an import row against the model fields and returns an
+    unsaved User, the password
+    must already be a hash Django can identify, rows without one get an
+    unusable password
+    """
+    email = User.objects.normalize_email((row.get('email') or '').strip())
+    validate_email(email)
+
+    password = row.get('password') or None
+    if password:
+        try:
+            identify_hasher(password)
+        except ValueError:
+            raise ValidationError("password is not a recognised hash")
+    else:
+        password = make_password(None)
+
+    phone_number = row.get('phone_number') or None
+    if phone_number:
+        phone_number = normalize_phone_number(phone_number)
+        if phone_number is None:
+            raise ValidationError("invalid phone number")
+
+    gender = row.get('gender') or "None"
+    if gender not in GENDERS:
+        raise ValidationError("invalid gender")
+
+    is_active = row.get('is_active', True)
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() not in ('0', 'false', 'no', '')
+
+    user = User(
+        email=email,
+        password=password,
+        full_name=(row.get('full_name') or None),
+        phone_number=phone_number,
+        device_id=(row.get('device_id') or None),
+        gender=gender,
+        age=int(row.get('age') or 0),
+        is_active=is_active,
+    )
+    # lengths and ranges too, INSERT IGNORE on MySQL truncates values
+    # that do not fit instead of refusing the row
+    user.clean_fields()
+    return user
+
+
+def import_chunk(index, rows):
+    """
+    validates one chunk and bulk inserts its users and their profiles
+    without sending signals, returns the chunk index, how many users it
+    inserted, how many valid rows it skipped because their email or
+    number already exists or repeats in the chunk, and the row errors
+    """
+    close_old_connections()
+    users = {}
+    errors = []
+    valid = 0
+    for row in rows:
+        if isinstance(row, InvalidRow):
+            errors.append((None, row.error))
+            continue
+        try:
+            user = build_user(row)
+        except ValidationError as e:
+            if hasattr(e, 'error_dict'):
+                messages = [f"{field}: {message}" for field, items in e.message_dict.items() for message in items]
+            else:
+                messages = e.messages
+            errors.append((row.get('email'), "; ".join(messages)))
+            continue
+        except ValueError as e:
+            errors.append((row.get('email'), f"{e}"))
+            continue
+        valid += 1
+        users.setdefault(user.email, user)
+
+    existing = set(User.objects.filter(email__in=users.keys()).values_list('email', flat=True))
+    new_users = [user for email, user in users.items() if email not in existing]
+    User.objects.bulk_create(new_users, ignore_conflicts=True)
+    # ignore_conflicts hides which rows went in, a row carrying this
+    # worker's creation_time is one it inserted rather than one a
+    # concurrent worker or an existing phone number beat it to
+    stamps = {user.email: user.creation_time for user in new_users}
+    ids = [
+        id for id, email, creation_time in User.objects.filter(
+            email__in=stamps.keys()
+        ).values_list('id', 'email', 'creation_time')
+        if stamps[email] == creation_time
+    ]
+    Profile.objects.bulk_create(
+        [Profile(user_id=id) for id in ids],
+        ignore_conflicts=True
+    )
+    return index, len(ids), valid - len(ids), errors
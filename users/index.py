@@ -0,0 +1,286 @@
+import threading
+import hashlib
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connection
+from django.core.cache import cache
+from django.conf import settings
+
+GENERATION_KEY = "users:index:generation"
+WRITES_KEY = "users:index:writes"
+
+
+class BloomFilter:
+    """
+    fixed size Bloom filter sized for capacity keys at error_rate
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        """
+        sets the key's bits, count only grows when one was still unset
+        so re-adding a key does not wear the filter down
+        """
+        added = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def memory(self):
+        return len(self.bits)
+
+    @property
+    def false_positive_rate(self):
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+def index_key(kind, value):
+    if kind == "email":
+        value = value.lower()
+    return f"{kind}:{value}"
+
+
+class ExistenceIndex:
+    """
+    process local Bloom filter over user emails and phone numbers so
+    lookups for values that were never registered skip the database,
+    positives are always confirmed against the table. Every committed
+    user write bumps a counter in the shared cache, a miss is only
+    trusted while that counter matches the one the filter was last
+    brought up to date with
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.RLock()
+        self.bloom = None
+        self.warming = False
+        self.generation = None
+        self.writes = None
+        self.watermark = None
+        self.refreshed_at = 0
+        self.stale = 0
+        self.lookups = 0
+        self.negatives = 0
+        self.positives = 0
+        self.false_positives = 0
+
+    def warm(self):
+        """
+        rebuilds the filter from the user table
+        """
+        from .models import User
+
+        with self.refresh_lock:
+            # read first, a write landing during the scan bumps it again
+            writes = cache.get(WRITES_KEY, 0)
+            try:
+                total = User.objects.count()
+                bloom = BloomFilter(
+                    max(total * 2, settings.USER_INDEX_MIN_CAPACITY),
+                    settings.USER_INDEX_ERROR_RATE
+                )
+                watermark = None
+                rows = User.objects.order_by().values_list('email', 'phone_number', 'last_updated_time')
+                for email, phone_number, last_updated_time in rows.iterator(chunk_size=5000):
+                    bloom.add(index_key("email", email))
+                    if phone_number:
+                        bloom.add(index_key("phone", phone_number))
+                    if watermark is None or last_updated_time > watermark:
+                        watermark = last_updated_time
+            except DatabaseError:
+                return False
+            with self.lock:
+                self.bloom = bloom
+                self.watermark = watermark
+                self.generation = cache.get(GENERATION_KEY, 0)
+                self.writes = writes
+                self.refreshed_at = time.monotonic()
+                self.stale = 0
+            return True
+
+    def warm_in_background(self):
+        """
+        warms the filter on a thread so worker startup does not wait on
+        a scan of the user table, lookups go to the database meanwhile
+        """
+        def warm():
+            try:
+                self.warm()
+            finally:
+                self.warming = False
+                connection.close()
+
+        self.warming = True
+        threading.Thread(target=warm, name="user-index-warm", daemon=True).start()
+
+    def is_fresh(self):
+        return (
+            self.bloom is not None
+            and time.monotonic() - self.refreshed_at < settings.USER_INDEX_REFRESH_INTERVAL
+        )
+
+    def is_current(self):
+        """
+        True when no user write has committed anywhere since the filter
+        last read the table
+        """
+        return cache.get(WRITES_KEY, 0) == self.writes
+
+    def refresh(self, force=False):
+        """
+        warms a cold filter, otherwise pulls rows changed by other
+        processes since the last refresh, or rebuilds after
+        rebuild_user_index or once deletes and growth have worn it down.
+        last_updated_time is stamped on the app server before commit, so
+        a row can land behind the watermark when its transaction commits
+        late or its server's clock lags, each refresh rereads the last
+        USER_INDEX_WATERMARK_LAG seconds to catch those. Concurrent
+        callers wait for one refresh instead of each running their own.
+        force refreshes a fresh filter that is behind the write counter
+        """
+        from .models import User
+
+        with self.refresh_lock:
+            if self.is_fresh() and (not force or self.is_current()):
+                return True
+            bloom = self.bloom
+            if (
+                bloom is None
+                or cache.get(GENERATION_KEY, 0) != self.generation
+                or bloom.count + self.stale > bloom.capacity
+            ):
+                return self.warm()
+            writes = cache.get(WRITES_KEY, 0)
+            try:
+                rows = User.objects.order_by().values_list('email', 'phone_number', 'last_updated_time')
+                if self.watermark is not None:
+                    rows = rows.filter(
+                        last_updated_time__gte=self.watermark - settings.USER_INDEX_WATERMARK_LAG
+                    )
+                watermark = self.watermark
+                for email, phone_number, last_updated_time in rows.iterator(chunk_size=5000):
+                    self.add(email, phone_number)
+                    if watermark is None or last_updated_time > watermark:
+                        watermark = last_updated_time
+            except DatabaseError:
+                return False
+            self.watermark = watermark
+            self.writes = writes
+            self.refreshed_at = time.monotonic()
+            return True
+
+    def add(self, email, phone_number=None):
+        bloom = self.bloom
+        if bloom is None:
+            return
+        with self.lock:
+            bloom.add(index_key("email", email))
+            if phone_number:
+                bloom.add(index_key("phone", phone_number))
+
+    def discard(self):
+        self.stale += 1
+
+    def might_exist(self, kind, value):
+        """
+        False only when no user can have this value, refreshes at most
+        every USER_INDEX_REFRESH_INTERVAL seconds unless a miss finds
+        the filter behind the shared write counter
+        """
+        if self.bloom is None and self.warming:
+            return True
+        if not self.is_fresh() and not self.refresh():
+            return True
+        self.lookups += 1
+        if self.contains(kind, value):
+            return True
+        if not self.is_current() and (not self.refresh(force=True) or self.contains(kind, value)):
+            return True
+        self.negatives += 1
+        return False
+
+    async def amight_exist(self, kind, value):
+        if self.bloom is None and self.warming:
+            return True
+        if not self.is_fresh() and not await sync_to_async(self.refresh)():
+            return True
+        self.lookups += 1
+        if self.contains(kind, value):
+            return True
+        if not self.is_current() and (
+            not await sync_to_async(self.refresh)(force=True) or self.contains(kind, value)
+        ):
+            return True
+        self.negatives += 1
+        return False
+
+    def contains(self, kind, value):
+        return index_key(kind, value) in self.bloom
+
+    def record(self, exists):
+        self.positives += 1
+        if not exists:
+            self.false_positives += 1
+
+    def stats(self):
+        bloom = self.bloom
+        return {
+            "keys": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "memory_bytes": bloom.memory if bloom else 0,
+            "hashes": bloom.hashes if bloom else 0,
+            "stale": self.stale,
+            "estimated_false_positive_rate": bloom.false_positive_rate if bloom else 0,
+            "lookups": self.lookups,
+            "negatives": self.negatives,
+            "positives": self.positives,
+            "false_positives": self.false_positives,
+            "observed_false_positive_rate": (
+                self.false_positives / self.positives if self.positives else 0
+            ),
+        }
+
+
+user_index = ExistenceIndex()
+
+
+def bump_index_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def bump_index_writes():
+    """
+    called once a user write commits, tells every process's filter it
+    may be missing a key
+    """
+    try:
+        cache.incr(WRITES_KEY)
+    except ValueError:
+        cache.set(WRITES_KEY, 1, None)
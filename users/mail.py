@@ -0,0 +1,170 @@
+import threading
+import smtplib
+import time
+
+from django.core.mail.backends.smtp import EmailBackend
+from django.core.mail import EmailMessage, get_connection
+from django.conf import settings
+
+from .metrics import track_provider
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    bounded set of authenticated SMTP connections shared by every
+    PooledEmailBackend in the process that talks to the same server
+    """
+    def __init__(self, size, max_idle):
+        self.slots = threading.BoundedSemaphore(size)
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def checkout(self):
+        """
+        returns a healthy idle connection or None
+        """
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                connection, released_at = self.idle.pop()
+            if time.monotonic() - released_at < self.max_idle and is_healthy(connection):
+                return connection
+            discard(connection)
+
+    def checkin(self, connection):
+        with self.lock:
+            self.idle.append((connection, time.monotonic()))
+
+
+def is_healthy(connection):
+    try:
+        return connection.noop()[0] == 250
+    except (smtplib.SMTPException, OSError):
+        return False
+
+
+def discard(connection):
+    try:
+        connection.quit()
+    except (smtplib.SMTPException, OSError):
+        connection.close()
+
+
+def get_pool(key):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                settings.EMAIL_POOL_SIZE,
+                settings.EMAIL_POOL_MAX_IDLE
+            )
+        return _pools[key]
+
+
+class PooledEmailBackend(EmailBackend):
+    """
+    SMTP backend that borrows connections from a process wide pool and
+    hands them back on close instead of logging out, so bursts of mail
+    reuse a few TLS sessions
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = get_pool((self.host, self.port, self.username, self.use_tls, self.use_ssl))
+        self.holds_slot = False
+
+    def open(self):
+        if self.connection:
+            return False
+        if not self.pool.slots.acquire(timeout=settings.EMAIL_POOL_TIMEOUT):
+            if not self.fail_silently:
+                raise smtplib.SMTPException("No SMTP connection free in the pool")
+            return None
+        self.holds_slot = True
+        self.connection = self.pool.checkout()
+        if self.connection is not None:
+            return True
+        try:
+            opened = super().open()
+        except Exception:
+            self.release()
+            raise
+        if not opened:
+            self.release()
+        return opened
+
+    def close(self):
+        if self.connection is None:
+            return
+        self.pool.checkin(self.connection)
+        self.connection = None
+        self.release()
+
+    def send_messages(self, email_messages):
+        try:
+            return super().send_messages(email_messages)
+        except Exception:
+            if self.connection is not None:
+                discard(self.connection)
+                self.connection = None
+                self.release()
+            raise
+
+    def _send(self, email_message):
+        # lets a batch tell which of its messages went out before a failure
+        sent = super()._send(email_message)
+        email_message.delivered = sent
+        return sent
+
+    def release(self):
+        if self.holds_slot:
+            self.holds_slot = False
+            self.pool.slots.release()
+
+
+def send_email_batch(notifications):
+    """
+    sends email notifications in chunks of EMAIL_BATCH_SIZE, one
+    send_messages call per chunk on one checked out connection, and
+    returns a dict mapping each notification id to a (success, detail)
+    tuple. When a chunk fails part way, the messages sent before the
+    failure still count as sent
+    """
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        return {n.id: (False, f"{e}") for n in notifications}
+
+    results = {}
+    size = settings.EMAIL_BATCH_SIZE
+    try:
+        for start in range(0, len(notifications), size):
+            chunk = notifications[start:start + size]
+            messages = [
+                EmailMessage(
+                    n.subject,
+                    n.message,
+                    "support@forge.com",
+                    [n.recipient],
+                    connection=connection
+                )
+                for n in chunk
+            ]
+            try:
+                with track_provider("smtp"):
+                    sent = connection.send_messages(messages)
+                error = None if sent == len(messages) else "Not sent"
+            except Exception as e:
+                error = f"{e}"
+            for n, message in zip(chunk, messages):
+                if error is None or getattr(message, 'delivered', False):
+                    results[n.id] = (True, None)
+                else:
+                    results[n.id] = (False, error)
+    finally:
+        connection.close()
+    return results
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from users.geocoding import geocode_batch
+from users.models import User
+from users.tasks import geocode_pending_users
+
+
+class Command(BaseCommand):
+    help = "Reverse geocodes every located user without an address, inline or through the background worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule',
+            action='store_true',
+            help="Queue the users for the geocoding worker instead of geocoding them here."
+        )
+        parser.add_argument('--all', action='store_true', help="Also refresh users that already have an address.")
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(geohash=None)
+        if not options['all']:
+            users = users.filter(formater_address=None)
+        queued = users.update(geocode_pending=True)
+        self.stdout.write(f"Queued {queued} users for geocoding")
+        if options['schedule']:
+            geocode_pending_users()
+            return
+        total = 0
+        while True:
+            processed, failed = geocode_batch()
+            if failed:
+                self.stderr.write(f"{failed} lookups failed, the rest stay queued")
+                break
+            if not processed:
+                break
+            total += processed
+            self.stdout.write(f"Geocoded {total} users")
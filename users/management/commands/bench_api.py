@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, override_settings
+from django.core.management.base import BaseCommand, CommandError
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient
+
+from users.benchmark import BENCH_PASSWORD, build_scenarios, drive, scenario_users, seed_users, summarize
+from users.metrics import registry
+from users.index import user_index
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives every users and token route against a seeded test database with "
+        "in-process SMTP and SMS fakes, and compares the results with a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--routes', nargs='*', help="Only run these route names")
+        parser.add_argument('--baseline', help="JSON file to compare against")
+        parser.add_argument('--save-baseline', help="Write the results to this JSON file")
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help="Allowed p95 latency and throughput drift before a route counts as regressed"
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < options['requests'] * 6:
+            raise CommandError("--users must be at least six times --requests")
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                SMS_PROVIDER='users.sms.FakeSmsProvider',
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                GEOCODER='users.geocoding.FakeGeocoder',
+                RATE_LIMIT_ENABLED=False,
+            ):
+                results = asyncio.run(self.run(options))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump(results, baseline, indent=2, sort_keys=True)
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    async def run(self, options):
+        self.stdout.write(f"Seeding {options['users']} users")
+        await sync_to_async(seed_users)(options['users'])
+        users = await sync_to_async(scenario_users)(options['requests'])
+        admin = await sync_to_async(User.objects.create_superuser)('admin@bench.forge.com', BENCH_PASSWORD)
+        await sync_to_async(user_index.warm)()
+        scenarios = await sync_to_async(build_scenarios)(users, admin, options['requests'])
+
+        client = AsyncClient()
+        results = {}
+        self.stdout.write(
+            f"{'route':<24}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'errors':>8}"
+        )
+        for route, requests in scenarios.items():
+            if options['routes'] and route not in options['routes']:
+                continue
+            registry.routes.clear()
+            latencies, elapsed, errors = await drive(client, requests, options['concurrency'])
+            stats = summarize(latencies, elapsed)
+            stats["errors"] = errors
+            metrics = registry.routes.get(route.replace('-patch', '').replace('-delete', ''))
+            stats["queries"] = metrics.queries / metrics.count if metrics else 0
+            results[route] = stats
+            self.stdout.write(
+                f"{route:<24}{stats['rps']:>10.1f}{stats['p50']:>10.2f}"
+                f"{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['queries']:>10.1f}{errors:>8}"
+            )
+        return results
+
+    def compare(self, results, path, tolerance):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        for route, stats in results.items():
+            before = baseline.get(route)
+            if before is None:
+                continue
+            if stats['p95'] > before['p95'] * (1 + tolerance):
+                regressions.append(f"{route}: p95 {before['p95']:.2f}ms -> {stats['p95']:.2f}ms")
+            if stats['rps'] < before['rps'] * (1 - tolerance):
+                regressions.append(f"{route}: {before['rps']:.1f} -> {stats['rps']:.1f} rps")
+            if stats['errors'] > before.get('errors', 0):
+                regressions.append(f"{route}: {before.get('errors', 0)} -> {stats['errors']} error responses")
+            if stats['queries'] > before['queries']:
+                regressions.append(f"{route}: {before['queries']:.1f} -> {stats['queries']:.1f} queries")
+        if regressions:
+            raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}"))
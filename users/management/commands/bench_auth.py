@@ -0,0 +1,55 @@
+import time
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from users.authentication import CachedJWTAuthentication
+from users.models import User
+from users.tokens import VersionedRefreshToken, check_token_version
+
+
+class Command(BaseCommand):
+    help = "Measures the per request cost of JWT authentication with and without the revocation check."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.run(options['requests'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def time(self, count, call):
+        start = time.perf_counter()
+        for _ in range(count):
+            call()
+        return (time.perf_counter() - start) / count * 1e6
+
+    def run(self, count):
+        user = User.objects.create_user("bench-auth@forge.com")
+        token = VersionedRefreshToken.for_user(user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {token}")
+        validated = JWTAuthentication().get_validated_token(str(token).encode())
+
+        cached = CachedJWTAuthentication()
+        cached.authenticate(request)
+        results = (
+            ("simplejwt, user from the database", self.time(count, lambda: JWTAuthentication().authenticate(request))),
+            ("cached user with version check", self.time(count, lambda: cached.authenticate(request))),
+            ("version check alone", self.time(count, lambda: check_token_version(user, validated))),
+        )
+        self.stdout.write(f"{'authentication':<36}{'us/request':>12}")
+        for name, micros in results:
+            self.stdout.write(f"{name:<36}{micros:>12.2f}")
+
+        user.revoke_tokens()
+        try:
+            cached.authenticate(request)
+        except AuthenticationFailed as e:
+            self.stdout.write(f"revoked token rejected with {e.detail['code']}")
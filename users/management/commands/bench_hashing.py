@@ -0,0 +1,42 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.contrib.auth import hashers
+from django.test.utils import override_settings
+
+from users import hashing
+
+
+class Command(BaseCommand):
+    help = "Measures password hashes per second inline and through the hashing pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashes', type=int, default=40)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--iterations', type=int, default=None)
+
+    def handle(self, *args, **options):
+        overrides = {
+            'PASSWORD_HASHING_WORKERS': options['workers'],
+            'PASSWORD_HASHING_MAX_PENDING': options['hashes'],
+        }
+        if options['iterations']:
+            overrides['PASSWORD_HASH_ITERATIONS'] = options['iterations']
+        with override_settings(**overrides):
+            self.run(options['hashes'], options['workers'])
+
+    def run(self, count, workers):
+        start = time.perf_counter()
+        for i in range(count):
+            hashers.make_password(f"bench-password-{i}")
+        inline = count / (time.perf_counter() - start)
+
+        hashing.make_password("warm-up")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=count) as requests:
+            list(requests.map(hashing.make_password, (f"bench-password-{i}" for i in range(count))))
+        pooled = count / (time.perf_counter() - start)
+
+        self.stdout.write(f"inline: {inline:.1f} hashes/s on 1 core")
+        self.stdout.write(f"pool:   {pooled:.1f} hashes/s on {workers} workers, {pooled / workers:.1f} per core")
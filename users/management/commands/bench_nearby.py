@@ -0,0 +1,128 @@
+import random
+import time
+
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from users.benchmark import percentile
+from users.geo import encode_geohash, haversine
+from users.models import User
+from users.utils import nearby_users
+
+# Kenya, with a share of users packed into Nairobi
+AREA = (-4.7, 4.6, 33.9, 41.9)
+CITY = (-1.2921, 36.8219, 0.15)
+
+
+class Command(BaseCommand):
+    help = "Measures nearby user queries against a seeded table of located users, next to a full table scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--radius', type=float, default=5)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--scans', type=int, default=3, help="Full table scans to time as the baseline")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.seed(options['users'])
+            self.run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def seed(self, count, batch_size=10000):
+        """
+        inserts located users with executemany, model instances and
+        bulk_create spend minutes on a million rows
+        """
+        rng = random.Random(18)
+        start = time.perf_counter()
+        quote = connection.ops.quote_name
+        now = timezone.now()
+        # every column gets its model default so new NOT NULL fields
+        # without a database default keep seeding
+        defaults = {}
+        for field in User._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            value = now if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False) else field.get_default()
+            defaults[field.attname] = (field, value)
+        defaults['password'] = (User._meta.get_field('password'), "!")
+        columns = list(defaults)
+        sql = (
+            f"INSERT INTO {quote(User._meta.db_table)} ({', '.join(quote(column) for column in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        fixed = {
+            column: field.get_db_prep_save(value, connection)
+            for column, (field, value) in defaults.items()
+        }
+        prepare = {
+            column: defaults[column][0].get_db_prep_save
+            for column in ('email', 'latitude', 'longitude', 'geohash')
+        }
+        with connection.cursor() as cursor:
+            for offset in range(0, count, batch_size):
+                rows = []
+                for i in range(offset, min(offset + batch_size, count)):
+                    if rng.random() < 0.3:
+                        latitude = rng.gauss(CITY[0], CITY[2])
+                        longitude = rng.gauss(CITY[1], CITY[2])
+                    else:
+                        latitude = rng.uniform(AREA[0], AREA[1])
+                        longitude = rng.uniform(AREA[2], AREA[3])
+                    values = {
+                        'email': f"geo{i}@bench.forge.com",
+                        'latitude': latitude,
+                        'longitude': longitude,
+                        'geohash': encode_geohash(latitude, longitude),
+                    }
+                    row = dict(fixed)
+                    for column, value in values.items():
+                        row[column] = prepare[column](value, connection)
+                    rows.append(tuple(row[column] for column in columns))
+                cursor.executemany(sql, rows)
+        self.stdout.write(f"Seeded {count} users in {time.perf_counter() - start:.1f}s")
+
+    def run(self, options):
+        rng = random.Random(7)
+        radius, limit = options['radius'], options['limit']
+        centers = []
+        for i in range(options['queries']):
+            if i % 2:
+                centers.append((rng.gauss(CITY[0], CITY[2]), rng.gauss(CITY[1], CITY[2])))
+            else:
+                centers.append((rng.uniform(AREA[0], AREA[1]), rng.uniform(AREA[2], AREA[3])))
+
+        first, second = [], []
+        for latitude, longitude in centers:
+            start = time.perf_counter()
+            page, more = nearby_users(latitude, longitude, radius, limit)
+            first.append(time.perf_counter() - start)
+            if more:
+                start = time.perf_counter()
+                nearby_users(latitude, longitude, radius, limit, after=page[-1])
+                second.append(time.perf_counter() - start)
+
+        scans = []
+        for latitude, longitude in centers[:options['scans']]:
+            start = time.perf_counter()
+            matches = sorted(
+                (haversine(latitude, longitude, lat, lon), id)
+                for id, lat, lon in User.objects.order_by().values_list('id', 'latitude', 'longitude').iterator(chunk_size=5000)
+            )
+            [match for match in matches if match[0] <= radius][:limit]
+            scans.append(time.perf_counter() - start)
+
+        self.stdout.write(f"{'query':<20}{'runs':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, samples in (('nearby first page', first), ('nearby next page', second), ('full scan', scans)):
+            if samples:
+                self.stdout.write(
+                    f"{name:<20}{len(samples):>8}{percentile(samples, 50) * 1000:>10.2f}"
+                    f"{percentile(samples, 95) * 1000:>10.2f}{percentile(samples, 99) * 1000:>10.2f}"
+                )
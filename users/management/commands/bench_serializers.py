@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import Profile, User
+from users.serializers import ProfileReadSerializer, ProfileSerializer, UserReadSerializer, UsersSerializer
+
+
+class Command(BaseCommand):
+    help = "Compares serialization throughput of the model serializers and the read path serializers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--objects', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        users = [
+            User(
+                id=i, email=f"bench-{i}@forge.com", full_name=f"Bench User {i}",
+                phone_number=f"+2547{i:08d}", gender='male', age=30,
+                latitude=-1.2921, longitude=36.8219, image='users/bench.png',
+                creation_time=now, last_updated_time=now, last_login=now
+            )
+            for i in range(options['objects'])
+        ]
+        profiles = [
+            Profile(id=user.id, user=user, document='documents/bench.pdf', creation_time=now, last_updated_time=now)
+            for user in users
+        ]
+        self.stdout.write(f"{'serializer':<24}{'objects/s':>12}{'us/object':>12}")
+        for serializer, objects in (
+            (UsersSerializer, users),
+            (UserReadSerializer, users),
+            (ProfileSerializer, profiles),
+            (ProfileReadSerializer, profiles),
+        ):
+            start = time.perf_counter()
+            for instance in objects:
+                serializer(instance).data
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{serializer.__name__:<24}{len(objects) / elapsed:>12.0f}"
+                f"{elapsed / len(objects) * 1e6:>12.2f}"
+            )
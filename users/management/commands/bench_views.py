@@ -0,0 +1,47 @@
+import asyncio
+import random
+
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, override_settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+
+from users.benchmark import drive, summarize
+
+
+class Command(BaseCommand):
+    help = "Compares requests per second and latency of the sync and async hot endpoints over ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=20)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(ROOT_URLCONF='users.benchmark', RATE_LIMIT_ENABLED=False):
+                asyncio.run(self.run(options['requests'], options['concurrency']))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    async def run(self, requests, concurrency):
+        client = AsyncClient()
+        self.stdout.write(f"{'endpoint':<28}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for kind in ('sync', 'async'):
+            endpoints = {
+                'register/': [{"email": f"{kind}-{i}@bench.forge.com"} for i in range(requests)],
+                'otp/confirm/': [{"otp_code": random.randint(100001, 999999)} for _ in range(requests)],
+                'email/check/': [{"email": f"{kind}-{i}@bench.forge.com"} for i in range(requests)],
+            }
+            for endpoint, payloads in endpoints.items():
+                path = f'/{kind}/{endpoint}'
+                latencies, elapsed, _ = await drive(
+                    client,
+                    [('post', path, payload, {}) for payload in payloads],
+                    concurrency
+                )
+                stats = summarize(latencies, elapsed)
+                self.stdout.write(
+                    f"{kind + ' ' + endpoint:<28}{stats['rps']:>10.1f}"
+                    f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}"
+                )
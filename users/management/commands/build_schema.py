@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from forge.schema import build_schema, code_version
+
+
+class Command(BaseCommand):
+    help = "Generates the OpenAPI spec and its precompressed copies for the current code version."
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        paths = build_schema()
+        elapsed = time.perf_counter() - start
+        for path in paths:
+            self.stdout.write(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built schema {code_version()} in {elapsed * 1000:.0f}ms"
+        ))
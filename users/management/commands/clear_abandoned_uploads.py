@@ -0,0 +1,24 @@
+from background_task.models import Task
+from django.core.management.base import BaseCommand
+
+from users.tasks import sweep_abandoned_uploads
+from users.uploads import clear_abandoned_uploads
+
+
+class Command(BaseCommand):
+    help = "Deletes abandoned chunked uploads and their partial files, or schedules the daily sweeper."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule',
+            action='store_true',
+            help="Schedule the sweeper as a daily task for process_tasks."
+        )
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            sweep_abandoned_uploads(repeat=Task.DAILY, remove_existing_tasks=True)
+            self.stdout.write("Scheduled the daily upload sweeper")
+            return
+        deleted = clear_abandoned_uploads()
+        self.stdout.write(f"Deleted {deleted} abandoned uploads")
@@ -0,0 +1,24 @@
+from background_task.models import Task
+from django.core.management.base import BaseCommand
+
+from users.tasks import sweep_expired_otps
+from users.utils import clear_expired_otps
+
+
+class Command(BaseCommand):
+    help = "Deletes expired OTP codes, or schedules the hourly background sweeper."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--schedule',
+            action='store_true',
+            help="Schedule the sweeper as an hourly task for process_tasks."
+        )
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            sweep_expired_otps(repeat=Task.HOURLY, remove_existing_tasks=True)
+            self.stdout.write("Scheduled the hourly OTP sweeper")
+            return
+        deleted = clear_expired_otps()
+        self.stdout.write(f"Deleted {deleted} expired OTP codes")
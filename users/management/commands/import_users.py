@@ -0,0 +1,116 @@
+import json
+import time
+import os
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+import multiprocessing
+
+from users.importer import chunked, file_fingerprint, import_chunk, read_rows
+from users.index import bump_index_generation, bump_index_writes
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams users from a CSV or JSONL file into the database in bulk, "
+        "with precomputed password hashes and resumable checkpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'])
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--checkpoint',
+            help="File recording finished chunks, defaults to <path>.checkpoint"
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        format = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        self.checkpoint_path = options['checkpoint'] or f"{path}.checkpoint"
+        # chunk indexes only mean the same rows for the same file and batch size
+        self.plan = {
+            "file": file_fingerprint(path),
+            "format": format,
+            "batch_size": options['batch_size'],
+        }
+        self.done = self.load_checkpoint()
+        if self.done:
+            self.stdout.write(f"Resuming, {len(self.done)} chunks already imported")
+
+        self.inserted = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.started = time.perf_counter()
+        chunks = (
+            (index, chunk)
+            for index, chunk in enumerate(chunked(read_rows(path, format), options['batch_size']))
+            if index not in self.done
+        )
+        if options['workers'] > 1:
+            self.run_parallel(chunks, options['workers'])
+        else:
+            for index, chunk in chunks:
+                self.finish(*import_chunk(index, chunk))
+
+        bump_index_generation()
+        elapsed = time.perf_counter() - self.started
+        rows = self.inserted + self.skipped + self.invalid
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.inserted} rows, skipped {self.skipped} existing or duplicate, "
+            f"{self.invalid} invalid in {elapsed:.1f}s, {rows / elapsed if elapsed else 0:.0f} rows/s"
+        ))
+
+    def run_parallel(self, chunks, workers):
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            pending = set()
+            for index, chunk in chunks:
+                pending.add(executor.submit(import_chunk, index, chunk))
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self.finish(*future.result())
+            for future in wait(pending).done:
+                self.finish(*future.result())
+
+    def finish(self, index, inserted, skipped, errors):
+        if inserted:
+            bump_index_writes()
+        self.inserted += inserted
+        self.skipped += skipped
+        self.invalid += len(errors)
+        for email, error in errors[:5]:
+            self.stderr.write(f"chunk {index}: {email or '-'}: {error}")
+        self.done.add(index)
+        self.save_checkpoint()
+        elapsed = time.perf_counter() - self.started
+        rows = self.inserted + self.skipped + self.invalid
+        self.stdout.write(
+            f"chunk {index} done, {self.inserted} inserted, {rows / elapsed:.0f} rows/s"
+        )
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as checkpoint:
+            saved = json.load(checkpoint)
+        for key, value in self.plan.items():
+            if saved.get(key) != value:
+                raise CommandError(
+                    f"{self.checkpoint_path} was written for a different {key.replace('_', ' ')} "
+                    f"({saved.get(key)}), rerun with the same file and options or delete it"
+                )
+        return set(saved['chunks'])
+
+    def save_checkpoint(self):
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, 'w') as checkpoint:
+            json.dump({**self.plan, "chunks": sorted(self.done)}, checkpoint)
+        os.replace(temporary, self.checkpoint_path)
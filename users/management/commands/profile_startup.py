@@ -0,0 +1,64 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.conf import settings
+
+TARGETS = {
+    'setup': "import django; django.setup()",
+    'urls': "import django; django.setup(); from django.urls import get_resolver; get_resolver().url_patterns",
+    'asgi': "import forge.asgi",
+}
+
+
+class Command(BaseCommand):
+    help = "Reports cold start wall time and per module import time of a fresh interpreter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=sorted(TARGETS), default='urls')
+        parser.add_argument('--runs', type=int, default=5, help="Cold starts to time")
+        parser.add_argument('--limit', type=int, default=25, help="Modules and packages to list")
+
+    def handle(self, *args, **options):
+        code = TARGETS[options['target']]
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'forge.settings')}
+        cwd = settings.BASE_DIR
+
+        walls = []
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, check=True)
+            walls.append(time.perf_counter() - start)
+        self.stdout.write(
+            f"{options['target']} cold start over {len(walls)} runs: "
+            f"median {statistics.median(walls) * 1000:.0f}ms, min {min(walls) * 1000:.0f}ms"
+        )
+
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=cwd, env=env, check=True, capture_output=True, text=True
+        )
+        modules = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(own), int(cumulative)))
+
+        packages = defaultdict(int)
+        for name, own, _ in modules:
+            packages[name.split('.')[0]] += own
+        total = sum(packages.values())
+
+        limit = options['limit']
+        self.stdout.write(f"\n{'module':<52}{'self ms':>10}{'cumulative ms':>15}")
+        for name, own, cumulative in sorted(modules, key=lambda module: module[2], reverse=True)[:limit]:
+            self.stdout.write(f"{name:<52}{own / 1000:>10.1f}{cumulative / 1000:>15.1f}")
+        self.stdout.write(f"\n{'package':<52}{'self ms':>10}{'share':>15}")
+        for name, own in sorted(packages.items(), key=lambda package: package[1], reverse=True)[:limit]:
+            self.stdout.write(f"{name:<52}{own / 1000:>10.1f}{own / total:>15.1%}")
+        self.stdout.write(f"\n{len(modules)} modules imported in {total / 1000:.0f}ms")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users.index import bump_index_generation, user_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the email and phone existence index and tells running workers to rebuild theirs."
+
+    def handle(self, *args, **options):
+        if not user_index.warm():
+            self.stderr.write("Could not read the user table")
+            return
+        bump_index_generation()
+        for name, value in user_index.stats().items():
+            self.stdout.write(f"{name}: {value}")
@@ -0,0 +1,205 @@
+import contextvars
+import threading
+import logging
+import random
+import time
+
+from collections import deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from django.core.cache import cache
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PROVIDERS = ("smtp", "sms", "geocoder")
+
+_current = contextvars.ContextVar('users_metrics_request', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'provider_time', 'sampled')
+
+    def __init__(self, sampled):
+        self.queries = 0
+        self.db_time = 0.0
+        self.provider_time = 0.0
+        self.sampled = sampled
+
+
+class RouteMetrics:
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'db_time', 'provider_time')
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.provider_time = 0.0
+
+
+class Registry:
+    """
+    per process request metrics keyed by resolved URL name
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.slow_queries = deque(maxlen=100)
+
+    def observe(self, route, duration, stats):
+        with self.lock:
+            metrics = self.routes.get(route)
+            if metrics is None:
+                metrics = self.routes[route] = RouteMetrics()
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[i] += 1
+            metrics.count += 1
+            metrics.duration += duration
+            metrics.queries += stats.queries
+            metrics.db_time += stats.db_time
+            metrics.provider_time += stats.provider_time
+
+    def render(self):
+        """
+        returns the metrics in the Prometheus text exposition format
+        """
+        with self.lock:
+            routes = sorted(self.routes.items())
+            lines = [
+                "# HELP forge_request_duration_seconds Request latency by route.",
+                "# TYPE forge_request_duration_seconds histogram",
+            ]
+            for route, metrics in routes:
+                for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                    lines.append(f'forge_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {count}')
+                lines.append(f'forge_request_duration_seconds_bucket{{route="{route}",le="+Inf"}} {metrics.count}')
+                lines.append(f'forge_request_duration_seconds_sum{{route="{route}"}} {metrics.duration}')
+                lines.append(f'forge_request_duration_seconds_count{{route="{route}"}} {metrics.count}')
+            for name, attribute, help_text in (
+                ("forge_request_queries_total", "queries", "SQL queries run by route."),
+                ("forge_request_db_seconds_total", "db_time", "Time spent in SQL by route."),
+                ("forge_request_provider_seconds_total", "provider_time", "Time spent calling SMTP and SMS providers by route."),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for route, metrics in routes:
+                    lines.append(f'{name}{{route="{route}"}} {getattr(metrics, attribute)}')
+
+        provider_values = cache.get_many(
+            [f"users:metrics:{provider}:{field}" for provider in PROVIDERS for field in ("calls", "errors", "micros")]
+        )
+        for name, field, help_text, scale in (
+            ("forge_provider_calls_total", "calls", "Provider calls from every process.", 1),
+            ("forge_provider_errors_total", "errors", "Failed provider calls from every process.", 1),
+            ("forge_provider_seconds_total", "micros", "Time spent in provider calls from every process.", 1e-6),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for provider in PROVIDERS:
+                value = provider_values.get(f"users:metrics:{provider}:{field}", 0) * scale
+                lines.append(f'{name}{{provider="{provider}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    database execute wrapper that charges queries to the current request
+    and keeps sampled slow ones
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += duration
+        if stats.sampled and duration * 1000 >= settings.METRICS_SLOW_QUERY_MS:
+            registry.slow_queries.append({"sql": sql, "duration_ms": duration * 1000})
+            logger.warning("slow query %.1fms: %s", duration * 1000, sql)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _incr(key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+@contextmanager
+def track_provider(provider):
+    """
+    times an SMTP, SMS or geocoder call, charging it to the current
+    request if any and to counters shared through the cache
+    """
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        stats = _current.get()
+        if stats is not None:
+            stats.provider_time += duration
+        _incr(f"users:metrics:{provider}:calls", 1)
+        _incr(f"users:metrics:{provider}:micros", int(duration * 1e6))
+        if failed:
+            _incr(f"users:metrics:{provider}:errors", 1)
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """
+    records latency, query count, DB time and provider time for every
+    request under its resolved URL name
+    """
+    def begin():
+        stats = RequestStats(random.random() < settings.METRICS_SLOW_QUERY_SAMPLE_RATE)
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(request, stats, token, start):
+        _current.reset(token)
+        registry.observe(_route(request), time.perf_counter() - start, stats)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            stats, token, start = begin()
+            try:
+                return await get_response(request)
+            finally:
+                finish(request, stats, token, start)
+    else:
+        def middleware(request):
+            stats, token, start = begin()
+            try:
+                return get_response(request)
+            finally:
+                finish(request, stats, token, start)
+    return middleware
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='otp_code',
+        ),
+        migrations.CreateModel(
+            name='Otp',
+            fields=[
+                ('code', models.IntegerField(primary_key=True, serialize=False)),
+                ('expiry_time', models.DateTimeField(db_index=True)),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='otps', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_notification_provider_reference'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='last_updated_time',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
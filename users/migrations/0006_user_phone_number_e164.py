@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:26
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# frozen copy of users.phone at the time of this migration
+E164 = re.compile(r"^\+[1-9]\d{7,14}$")
+
+
+def normalize_phone_number(value):
+    number = re.sub(r"[\s\-().]", "", value)
+    if number.startswith("00"):
+        number = f"+{number[2:]}"
+    elif number.startswith("0"):
+        number = f"+{settings.PHONE_REGION_CODE}{number[1:]}"
+    elif not number.startswith("+"):
+        number = f"+{number}"
+    return number if E164.match(number) else None
+
+
+def normalize_phone_numbers(apps, schema_editor):
+    """
+    rewrites stored numbers to E.164 and, where several users share a
+    number, keeps it on the most recently updated one. Numbers with no
+    E.164 form are cleared and reported
+    """
+    User = apps.get_model('users', 'User')
+    seen = set()
+    changed = []
+    invalid = []
+    users = User.objects.exclude(phone_number=None).order_by('-last_updated_time', '-id')
+    for user in users.only('id', 'phone_number').iterator(chunk_size=2000):
+        number = normalize_phone_number(user.phone_number)
+        if number is None and user.phone_number.strip():
+            invalid.append(user.id)
+        if number in seen:
+            number = None
+        if number is not None:
+            seen.add(number)
+        if number != user.phone_number:
+            user.phone_number = number
+            changed.append(user)
+        if len(changed) >= 2000:
+            User.objects.bulk_update(changed, ['phone_number'])
+            changed = []
+    User.objects.bulk_update(changed, ['phone_number'])
+    if invalid:
+        print(f"\n  Cleared {len(invalid)} phone numbers with no E.164 form, user ids: {invalid[:100]}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_last_updated_time_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.RunPython(normalize_phone_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+from users.geo import encode_geohash
+
+
+def backfill_geohashes(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    changed = []
+    users = User.objects.exclude(latitude=None).exclude(longitude=None)
+    for user in users.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        user.geohash = encode_geohash(user.latitude, user.longitude)
+        changed.append(user)
+        if len(changed) >= 2000:
+            User.objects.bulk_update(changed, ['geohash'])
+            changed = []
+    User.objects.bulk_update(changed, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.RunPython(backfill_geohashes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['geohash', 'latitude', 'longitude'], name='users_user_geo_idx'),
+        ),
+    ]
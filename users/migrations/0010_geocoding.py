@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_user_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('key', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('address', models.CharField(max_length=255)),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('last_used_time', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='geocode_pending',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+    ]
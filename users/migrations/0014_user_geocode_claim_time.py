@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_notification_sending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='geocode_claim_time',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
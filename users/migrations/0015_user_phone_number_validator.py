@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:27
+
+from django.db import migrations, models
+import users.phone
+
+
+def clear_invalid_phone_numbers(apps, schema_editor):
+    """
+    databases migrated before 0006 cleared invalid numbers may still
+    hold raw ones, those are cleared and reported
+    """
+    User = apps.get_model('users', 'User')
+    invalid = User.objects.exclude(phone_number=None).exclude(phone_number__regex=r'^\+[1-9][0-9]{7,14}$')
+    ids = list(invalid.values_list('id', flat=True)[:100])
+    cleared = invalid.update(phone_number=None)
+    if cleared:
+        print(f"\n  Cleared {cleared} phone numbers with no E.164 form, user ids: {ids}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_user_geocode_claim_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='phone_number',
+            field=models.CharField(blank=True, max_length=16, null=True, unique=True, validators=[users.phone.validate_phone_number]),
+        ),
+        migrations.RunPython(clear_invalid_phone_numbers, migrations.RunPython.noop),
+    ]
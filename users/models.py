@@ -1,17 +1,21 @@
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.core.mail import send_mail
 from django.dispatch import receiver
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+import uuid
 
-import africastalking as at
-
-AFRICAS_TALKING = settings.AFRICAS_TALKING
-
-at.initialize('glitex', AFRICAS_TALKING)
-
-sms = at.SMS
+from .cache import invalidate_cached_user
+from .index import bump_index_writes, user_index
+from .phone import normalize_phone_number, validate_phone_number
+from .geo import encode_geohash
+from .metrics import track_provider
+from . import hashing
+from .sms import get_sms_provider
 
 
 GENDER = (
@@ -20,6 +24,37 @@ GENDER = (
     ("Female", "Female")
 )
 
+NOTIFICATION_CHANNELS = (
+    ("email", "Email"),
+    ("sms", "SMS")
+)
+
+UPLOAD_STATUS = (
+    ("pending", "Pending"),
+    ("complete", "Complete")
+)
+
+NOTIFICATION_STATUS = (
+    ("pending", "Pending"),
+    ("sending", "Sending"),
+    ("sent", "Sent"),
+    ("failed", "Failed")
+)
+
+
+class ImageAsset(models.Model):
+    """
+    an uploaded image stored once per content hash, variants maps a
+    size to the stored name of each recompressed format
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    original = models.ImageField(upload_to='users/originals')
+    variants = models.JSONField(default=dict, blank=True)
+    creation_time = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
+
 
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None):
@@ -50,6 +85,14 @@ class User(AbstractBaseUser):
         null=True, 
         blank=True
     )
+    image_asset = models.ForeignKey(
+        ImageAsset,
+        on_delete=models.SET_NULL,
+        related_name='users',
+        null=True,
+        blank=True
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
     email = models.EmailField(unique=True)
     full_name = models.CharField(
         max_length=15,
@@ -57,9 +100,11 @@ class User(AbstractBaseUser):
         blank=True
     )
     phone_number = models.CharField(
-        max_length=15,
+        max_length=16,
+        unique=True,
         null=True, 
-        blank=True
+        blank=True,
+        validators=[validate_phone_number]
     )
     device_id = models.CharField(
         max_length=255,
@@ -72,12 +117,27 @@ class User(AbstractBaseUser):
         max_length=6,
     )
     age = models.IntegerField(default=0)
-    otp_code = models.IntegerField(default=0)
 
     phone_otp_registration = models.BooleanField(default=False)
 
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(
+        max_length=12,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    geocode_pending = models.BooleanField(
+        default=False,
+        db_index=True,
+        editable=False
+    )
+    geocode_claim_time = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False
+    )
     formater_address = models.CharField(
         max_length=255,
         null=True, 
@@ -87,12 +147,16 @@ class User(AbstractBaseUser):
     is_admin = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     creation_time = models.DateTimeField(auto_now_add=True)
-    last_updated_time = models.DateTimeField(auto_now=True)
+    last_updated_time = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
-        ordering = ['-creation_time',]
+        indexes = [
+            models.Index(fields=['geohash', 'latitude', 'longitude'], name='users_user_geo_idx'),
+            models.Index(fields=['creation_time', 'id'], name='users_user_created_idx'),
+        ]
 
     objects = UserManager()
 
@@ -101,6 +165,38 @@ class User(AbstractBaseUser):
     def __str__(self):
         return self.email
 
+    def save(self, *args, **kwargs):
+        if self.phone_number:
+            number = normalize_phone_number(self.phone_number)
+            if number is None:
+                # keeps the unique index and exact lookups on E.164 only
+                raise ValidationError({'phone_number': ["Enter a valid phone number."]})
+            self.phone_number = number
+        else:
+            self.phone_number = None
+        geohash = None
+        if self.latitude is not None and self.longitude is not None:
+            geohash = encode_geohash(self.latitude, self.longitude)
+        # the stored geohash doubles as the previous location
+        self._location_changed = geohash is not None and geohash != self.geohash
+        self.geohash = geohash
+        if self._location_changed:
+            self.geocode_pending = True
+        elif geohash is None:
+            self.geocode_pending = False
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # token_version only moves through revoke_tokens, a full save
+            # of a copy loaded before a revocation must not roll it back
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'token_version' and field.attname not in deferred
+            ]
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {'geohash', 'geocode_pending', *update_fields}
+        return super().save(*args, **kwargs)
+
     def has_perm(self, perm, obj=None):
         return self.is_admin
 
@@ -110,42 +206,75 @@ class User(AbstractBaseUser):
     @property
     def is_staff(self):
         return self.is_admin
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+        return hashing.check_password(raw_password, self.password, setter)
     
-    def send_phonenumber_opt(self):
-        otp = self.otp_code
-        message = f"Your Account Confirmation OTP code is: {otp}"
-        num = self.phone_number
-        try:
-            sms_msg = sms.send(message, [num], "Glitex")
-            print(sms_msg)
-            return True
-            
-        except Exception as e:
-            print(f"{e}")
-            return False
+    def send_phonenumber_opt(self, otp):
+        from .tasks import queue_notification
+        return queue_notification(
+            self,
+            "sms",
+            self.phone_number,
+            f"Your Account Confirmation OTP code is: {otp}"
+        )
     
-    def send_otp(self):
-        return send_mail(
-            "Confirmation OTP",
-            f"Your account confirmation OTP code is: {self.otp_code}",
-            "support@forge.com",
-            [self.email],
-            fail_silently=True
+    def send_otp(self, otp):
+        from .tasks import queue_notification
+        return queue_notification(
+            self,
+            "email",
+            self.email,
+            f"Your account confirmation OTP code is: {otp}",
+            subject="Confirmation OTP"
         )
     
     def send_password_change_email(self, password):
-        return send_mail(
-            "Password Change Alert",
+        from .tasks import queue_notification
+        return queue_notification(
+            self,
+            "email",
+            self.email,
             f"Your password has been chamged to {password}, make sure to change it to a secure one.",
-            "support@forge.com",
-            [self.email],
-            fail_silently=True
+            subject="Password Change Alert"
         )
     
+    def revoke_tokens(self):
+        """
+        invalidates every JWT issued so far, the version is bumped in the
+        database so concurrent revocations all count and a stale copy of
+        the user saved later cannot restore it
+        """
+        User.objects.filter(pk=self.pk).update(
+            token_version=F('token_version') + 1,
+            last_updated_time=timezone.now()
+        )
+        self.refresh_from_db(fields=['token_version', 'last_updated_time'])
+        invalidate_cached_user(self.pk)
+
+    async def arevoke_tokens(self):
+        """
+        async version of revoke_tokens for the async views
+        """
+        await User.objects.filter(pk=self.pk).aupdate(
+            token_version=F('token_version') + 1,
+            last_updated_time=timezone.now()
+        )
+        await self.arefresh_from_db(fields=['token_version', 'last_updated_time'])
+        invalidate_cached_user(self.pk)
+
     def update_user_password(self, password):
         self.set_password(password)
-        self.otp_code = 0
-        return self.save()
+        self.save(update_fields=['password', 'last_updated_time'])
+        self.revoke_tokens()
     
 
 class Profile(models.Model):
@@ -162,12 +291,130 @@ class Profile(models.Model):
     last_updated_time = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-creation_time',]
+        indexes = [
+            models.Index(fields=['creation_time', 'id'], name='users_profile_created_idx'),
+        ]
 
     def __str__(self):
         return self.user.email
+
+
+class Otp(models.Model):
+    code = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='otps'
+    )
+    expiry_time = models.DateTimeField(db_index=True)
+    creation_time = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.code}"
+
+
+class Notification(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    channel = models.CharField(
+        choices=NOTIFICATION_CHANNELS,
+        max_length=5
+    )
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(
+        max_length=255,
+        blank=True,
+        default=""
+    )
+    message = models.TextField()
+    status = models.CharField(
+        choices=NOTIFICATION_STATUS,
+        default="pending",
+        max_length=7,
+        db_index=True
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    provider_reference = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True
+    )
+    sent_time = models.DateTimeField(null=True, blank=True)
+
+    creation_time = models.DateTimeField(auto_now_add=True)
+    last_updated_time = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+    def deliver(self):
+        """
+        sends the notification through its provider, raises on failure
+        """
+        if self.channel == "email":
+            with track_provider("smtp"):
+                send_mail(
+                    self.subject,
+                    self.message,
+                    "support@forge.com",
+                    [self.recipient]
+                )
+        else:
+            with track_provider("sms"):
+                results = get_sms_provider().send(self.message, [self.recipient])
+            success, detail = results.get(self.recipient, (False, "No result from provider"))
+            if not success:
+                raise Exception(f"SMS not accepted: {detail}")
+            self.provider_reference = detail
     
 
+class ChunkedUpload(models.Model):
+    """
+    a resumable upload written to disk chunk by chunk, offset is the
+    number of bytes received so far and checksum the sha256 of the
+    whole file
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='uploads'
+    )
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    checksum = models.CharField(max_length=64)
+    status = models.CharField(
+        choices=UPLOAD_STATUS,
+        default="pending",
+        max_length=8
+    )
+    creation_time = models.DateTimeField(auto_now_add=True)
+    last_updated_time = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class GeocodeCache(models.Model):
+    """
+    reverse geocoded address of a rounded coordinate pair, the least
+    recently used entries are evicted past GEOCODE_CACHE_SIZE
+    """
+    key = models.CharField(max_length=32, primary_key=True)
+    address = models.CharField(max_length=255)
+    creation_time = models.DateTimeField(auto_now_add=True)
+    last_used_time = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key} {self.address}"
+
+
 @receiver(post_save, sender=User)
 def create_profile(sender, instance=None, created=False, **kwargs):
     """
@@ -177,6 +424,37 @@ def create_profile(sender, instance=None, created=False, **kwargs):
         Profile.objects.create(
             user=instance
         )
-        if not instance.phone_otp_registration:
-            if not  instance.is_superuser:
-                instance.send_otp()
\ No newline at end of file
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance=None, **kwargs):
+    """
+    drops the cached copy used by JWT authentication, this also covers
+    password changes since they save the user
+    """
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance=None, **kwargs):
+    user_index.add(instance.email, instance.phone_number)
+    transaction.on_commit(bump_index_writes)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance=None, **kwargs):
+    user_index.discard()
+
+
+@receiver(post_save, sender=User)
+def geocode_user(sender, instance=None, **kwargs):
+    """
+    hands a moved user to the batched reverse geocoder once the
+    transaction commits
+    """
+    if getattr(instance, '_location_changed', False):
+        from .tasks import geocode_pending_users
+        transaction.on_commit(
+            lambda: geocode_pending_users(schedule=settings.GEOCODE_BATCH_WINDOW)
+        )
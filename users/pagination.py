@@ -0,0 +1,81 @@
+import base64
+
+from rest_framework.pagination import BasePagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q
+from django.conf import settings
+
+
+class KeysetPagination(BasePagination):
+    """
+    newest first pages keyed on the indexed (creation_time, id) pair,
+    the cursor holds the last row of the previous page so every page is
+    an index range scan however deep it is, unlike OFFSET
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def encode_cursor(self, instance):
+        position = f"{instance.creation_time.isoformat()}|{instance.id}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            creation_time, id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            creation_time = parse_datetime(creation_time)
+            id = int(id)
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        if creation_time is None:
+            raise NotFound("Invalid cursor")
+        return creation_time, id
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, settings.STAFF_PAGE_SIZE))
+        except ValueError:
+            size = settings.STAFF_PAGE_SIZE
+        return min(max(size, 1), settings.STAFF_MAX_PAGE_SIZE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            creation_time, id = self.decode_cursor(cursor)
+            # the leading range keeps the index usable on MySQL as well
+            queryset = queryset.filter(
+                Q(creation_time__lte=creation_time),
+                Q(creation_time__lt=creation_time) | Q(id__lt=id)
+            )
+        page = list(queryset.order_by('-creation_time', '-id')[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,34 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+E164 = re.compile(r"^\+[1-9]\d{7,14}$")
+
+
+def normalize_phone_number(value, region_code=None):
+    """
+    returns the number in E.164 form or None if it can't be one,
+    national numbers with a leading 0 get PHONE_REGION_CODE
+    """
+    if not value:
+        return None
+    number = re.sub(r"[\s\-().]", "", value)
+    if number.startswith("00"):
+        number = f"+{number[2:]}"
+    elif number.startswith("0"):
+        number = f"+{region_code or settings.PHONE_REGION_CODE}{number[1:]}"
+    elif not number.startswith("+"):
+        number = f"+{number}"
+    if not E164.match(number):
+        return None
+    return number
+
+
+def validate_phone_number(value):
+    """
+    model validator, numbers that have no E.164 form are refused
+    instead of being stored as typed
+    """
+    if value and normalize_phone_number(value) is None:
+        raise ValidationError("Enter a valid phone number.", code="invalid")
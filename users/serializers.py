@@ -1,39 +1,88 @@
-from rest_framework.validators import UniqueValidator
-from django.core.validators import RegexValidator
+import re
+
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from django.conf import settings
+from django.core.files.storage import default_storage
 
+from .phone import normalize_phone_number
+from .images import store_image
+from .index import user_index
 from .models import *
-from .utils import create_user_otp
+from .utils import email_exists, otp_exists, phone_number_exists
+
+
+class PhoneNumberField(serializers.CharField):
+    """
+    accepts international or national numbers and returns them in E.164
+    """
+    default_error_messages = {
+        'invalid': 'Enter a valid phone number.'
+    }
+
+    def to_internal_value(self, data):
+        number = normalize_phone_number(super().to_internal_value(data))
+        if number is None:
+            self.fail('invalid')
+        return number
 
 
 class UsersSerializer(serializers.ModelSerializer):
+    phone_number = PhoneNumberField(
+        required=False,
+        allow_null=True,
+        allow_blank=True,
+        validators=[UniqueValidator(queryset=User.objects.all())]
+    )
+
     class Meta:
         model = User
         fields = '__all__'
+        read_only_fields = ('image_asset', 'image_variants')
+
+    def validate_latitude(self, value):
+        if value is not None and not -90 <= value <= 90:
+            raise serializers.ValidationError("Latitude must be between -90 and 90.")
+        return value
+
+    def validate_longitude(self, value):
+        if value is not None and not -180 <= value <= 180:
+            raise serializers.ValidationError("Longitude must be between -180 and 180.")
+        return value
+
+    def update(self, instance, validated_data):
+        if validated_data.get('image'):
+            asset = store_image(validated_data['image'])
+            validated_data['image'] = asset.original.name
+            validated_data['image_asset'] = asset
+            validated_data['image_variants'] = asset.variants
+        elif 'image' in validated_data:
+            validated_data['image_asset'] = None
+            validated_data['image_variants'] = {}
+        # only the patched columns are written, a full save would put
+        # back anything another request changed since the user was read
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'last_updated_time'])
+        return instance
 
 
 class RegistrationSerializer(serializers.Serializer):
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())]
-    )
+    email = serializers.EmailField(required=True)
 
-    def create(self, validated_data):
-        otp = create_user_otp()
-        user = User.objects.create(
-            email=validated_data['email'],
-            otp_code=otp
-        )
-        user.save()
-        return user
+    def validate_email(self, value):
+        if email_exists(value):
+            raise serializers.ValidationError("This field must be unique.")
+        return value
     
 
-class OtpConfirmationSerializer(serializers.Serializer):
+class OtpCodeSerializer(serializers.Serializer):
     otp_code = serializers.IntegerField(required=True)
 
+
+class OtpConfirmationSerializer(OtpCodeSerializer):
     def validate_otp_code(self, value):
-        exists = User.objects.filter(otp_code=value).exists()
-        if not exists:
+        if not otp_exists(value):
             raise serializers.ValidationError("OTP code entered does not exist.")
         return value
     
@@ -42,13 +91,12 @@ class ResendOtpSerializer(serializers.Serializer):
     email = serializers.EmailField(required=True)
 
     def validate_email(self, value):
-        exists = User.objects.filter(email=value).exists()
-        if not exists:
+        if not email_exists(value):
             raise serializers.ValidationError("Email entered does not exist.")
         return value
     
     
-class SetUserPasswordSerializer(OtpConfirmationSerializer):
+class SetUserPasswordSerializer(OtpCodeSerializer):
     password = serializers.CharField(required=True)
     password2 = serializers.CharField(required=True)
 
@@ -74,36 +122,144 @@ class EmailCheckSerializer(serializers.Serializer):
     
 
 class ProfileSerializer(serializers.ModelSerializer):
+    user = UsersSerializer(read_only=True)
+
     class Meta:
         model = Profile
         fields = '__all__'
 
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ('id', 'filename', 'size', 'offset', 'checksum', 'status', 'creation_time', 'last_updated_time')
+        read_only_fields = ('id', 'offset', 'status', 'creation_time', 'last_updated_time')
+
+    def validate_size(self, value):
+        if value <= 0 or value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes."
+            )
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("Checksum must be a hex encoded sha256 digest.")
+        return value
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+def _datetime(value, request):
+    return _datetime_field.to_representation(value)
+
+
+def _url(name, request):
+    url = default_storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+def _file_url(value, request):
+    if not value:
+        return None
+    return _url(value.name, request)
+
+
+def _variant_urls(value, request):
+    return {
+        size: {format: _url(name, request) for format, name in formats.items()}
+        for size, formats in value.items()
+    }
+
+
+class ReadSerializer(serializers.BaseSerializer):
+    """
+    read only serializer driven by a precomputed field plan of
+    (attribute, converter) pairs instead of ModelSerializer introspection
+    """
+    field_plan = ()
+
+    @classmethod
+    def represent(cls, instance, request=None):
+        data = {}
+        for name, convert in cls.field_plan:
+            value = getattr(instance, name)
+            data[name] = value if convert is None else convert(value, request)
+        return data
+
     def to_representation(self, instance):
-        self.fields["user"] = UsersSerializer(read_only=True)
-        return super(ProfileSerializer, self).to_representation(instance)
+        return self.represent(instance, self.context.get('request'))
+
+
+class UserReadSerializer(ReadSerializer):
+    field_plan = (
+        ('id', None),
+        ('last_login', _datetime),
+        ('image', _file_url),
+        ('image_variants', _variant_urls),
+        ('email', None),
+        ('full_name', None),
+        ('phone_number', None),
+        ('device_id', None),
+        ('gender', None),
+        ('age', None),
+        ('phone_otp_registration', None),
+        ('latitude', None),
+        ('longitude', None),
+        ('formater_address', None),
+        ('is_admin', None),
+        ('is_superuser', None),
+        ('is_active', None),
+        ('creation_time', _datetime),
+        ('last_updated_time', _datetime),
+    )
+
+
+class NearbyUserSerializer(ReadSerializer):
+    field_plan = (
+        ('id', None),
+        ('full_name', None),
+        ('gender', None),
+        ('image', _file_url),
+        ('image_variants', _variant_urls),
+        ('distance', None),
+    )
+
+
+class ProfileReadSerializer(ReadSerializer):
+    field_plan = (
+        ('id', None),
+        ('user', UserReadSerializer.represent),
+        ('document', _file_url),
+        ('creation_time', _datetime),
+        ('last_updated_time', _datetime),
+    )
     
 
 class PhonenumberRegistrationSerializer(serializers.Serializer):
-    phone_number = serializers.CharField(
-        required=True,
-        validators=[RegexValidator(r"^\+[1-9]\d{10,14}$")]
-    )
+    phone_number = PhoneNumberField(required=True)
 
     def validate_phone_number(self, value):
-        user = User.objects.filter(phone_number=value)
-        if user.exists():
+        if phone_number_exists(value):
             raise serializers.ValidationError("User with Phonenumber entered already exist.")
         return value
     
 
 class PhonenumberSendOtpSerializer(serializers.Serializer):
-    phone_number = serializers.CharField(
-        required=True,
-        validators=[RegexValidator(r"^\+[1-9]\d{10,14}$")]
-    )
+    phone_number = PhoneNumberField(required=True)
 
     def validate_phone_number(self, value):
-        user = User.objects.filter(phone_number=value).first()
+        user = None
+        if user_index.might_exist("phone", value):
+            try:
+                user = User.objects.only('id', 'phone_number').get(phone_number=value)
+            except User.DoesNotExist:
+                pass
+            user_index.record(user is not None)
         if not user:
             raise serializers.ValidationError("User with Phonenumber entered does not exist.")
         return user
\ No newline at end of file
@@ -0,0 +1,32 @@
+from django.db import transaction
+
+from .utils import create_user_otp
+from .models import User
+
+
+def register_user(email):
+    """
+    creates an email user with its profile and OTP in one transaction
+    and queues the OTP mail, returns the user and the OTP
+    """
+    with transaction.atomic():
+        user = User.objects.create(email=email)
+        otp = create_user_otp(user, replace=False)
+        user.send_otp(otp)
+    return user, otp
+
+
+def register_phone_user(phone_number):
+    """
+    creates a phone user with its profile and OTP in one transaction
+    and queues the OTP SMS, returns the user and the OTP
+    """
+    with transaction.atomic():
+        user = User.objects.create(
+            phone_number=phone_number,
+            phone_otp_registration=True,
+            email=f"{phone_number}@forge.com"
+        )
+        otp = create_user_otp(user, replace=False)
+        user.send_phonenumber_opt(otp)
+    return user, otp
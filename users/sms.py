@@ -0,0 +1,111 @@
+from django.utils.module_loading import import_string
+from django.conf import settings
+
+from .metrics import track_provider
+
+outbox = []
+
+_provider = None
+
+
+def get_sms_provider():
+    """
+    returns the process wide provider named by settings.SMS_PROVIDER
+    """
+    global _provider
+    if _provider is None:
+        _provider = import_string(settings.SMS_PROVIDER)()
+    return _provider
+
+
+class AfricasTalkingProvider:
+    """
+    sends SMS through the Africa's Talking messaging API, reusing one
+    HTTP session so batches ride on kept-alive connections
+    """
+    def __init__(self):
+        import requests
+
+        username = settings.SMS_USERNAME
+        domain = "sandbox.africastalking.com" if username == "sandbox" else "africastalking.com"
+        self.url = f"https://api.{domain}/version1/messaging"
+        self.username = username
+        self.sender_id = settings.SMS_SENDER_ID
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Accept": "application/json",
+            "ApiKey": settings.AFRICAS_TALKING,
+        })
+
+    def send(self, message, recipients):
+        """
+        sends one message to many recipients, returns a dict mapping
+        each number to a (success, message id or error status) tuple
+        """
+        response = self.session.post(
+            self.url,
+            data={
+                "username": self.username,
+                "to": ",".join(recipients),
+                "message": message,
+                "from": self.sender_id,
+            },
+            timeout=settings.SMS_TIMEOUT
+        )
+        response.raise_for_status()
+        results = {}
+        for recipient in response.json()["SMSMessageData"]["Recipients"]:
+            if recipient["status"] == "Success":
+                results[recipient["number"]] = (True, recipient.get("messageId"))
+            else:
+                results[recipient["number"]] = (False, recipient["status"])
+        return results
+
+
+class FakeSmsProvider:
+    """
+    offline provider for tests, records every call in sms.outbox and
+    rejects the numbers listed in failing
+    """
+    failing = set()
+
+    def send(self, message, recipients):
+        outbox.append((message, list(recipients)))
+        results = {}
+        for number in recipients:
+            if number in self.failing:
+                results[number] = (False, "InvalidPhoneNumber")
+            else:
+                results[number] = (True, f"fake-{len(outbox)}-{number}")
+        return results
+
+
+def send_sms_batch(notifications, provider=None):
+    """
+    sends SMS notifications grouped by identical message text, chunked
+    to SMS_BATCH_SIZE recipients per provider call, and returns a dict
+    mapping each notification id to a (success, detail) tuple
+    """
+    provider = provider or get_sms_provider()
+    groups = {}
+    for notification in notifications:
+        groups.setdefault(notification.message, []).append(notification)
+
+    results = {}
+    size = settings.SMS_BATCH_SIZE
+    for message, group in groups.items():
+        numbers = list(dict.fromkeys(n.recipient for n in group))
+        for start in range(0, len(numbers), size):
+            chunk = numbers[start:start + size]
+            try:
+                with track_provider("sms"):
+                    sent = provider.send(message, chunk)
+            except Exception as e:
+                sent = {number: (False, f"{e}") for number in chunk}
+            for notification in group:
+                if notification.recipient in chunk:
+                    results[notification.id] = sent.get(
+                        notification.recipient,
+                        (False, "No result from provider")
+                    )
+    return results
@@ -0,0 +1,166 @@
+from datetime import timedelta
+
+from background_task import background
+from django.db.models import Q
+from django.db import transaction
+from django.utils import timezone
+from django.conf import settings
+
+from .models import ImageAsset, Notification, User
+from .mail import send_email_batch
+from .sms import send_sms_batch
+from .images import build_variants
+from .uploads import clear_abandoned_uploads
+from .geocoding import geocode_batch
+from .utils import clear_expired_otps
+
+
+def batch_window(channel):
+    if channel == "sms":
+        return settings.SMS_BATCH_WINDOW
+    return settings.EMAIL_BATCH_WINDOW
+
+
+def queue_notification(user, channel, recipient, message, subject=""):
+    """
+    records a notification and hands it to the delivery workers
+    once the surrounding transaction commits, where it waits for the
+    next batch window of its channel
+    """
+    notification = Notification.objects.create(
+        user=user,
+        channel=channel,
+        recipient=recipient,
+        subject=subject,
+        message=message
+    )
+    transaction.on_commit(
+        lambda: dispatch_notifications(channel, schedule=batch_window(channel))
+    )
+    return notification
+
+
+@background(schedule=0, queue='notifications')
+def deliver_notification(notification_id):
+    """
+    delivers a queued notification, failures are re-raised so the
+    task is rescheduled with backoff until MAX_ATTEMPTS is reached
+    """
+    notification = Notification.objects.filter(id=notification_id).first()
+    if notification is None or notification.status != "pending":
+        return
+    try:
+        notification.deliver()
+    except Exception as e:
+        notification.attempts += 1
+        notification.last_error = f"{e}"
+        if notification.attempts >= settings.MAX_ATTEMPTS:
+            notification.status = "failed"
+        notification.save(update_fields=['attempts', 'last_error', 'status', 'last_updated_time'])
+        raise
+    notification.attempts += 1
+    notification.status = "sent"
+    notification.sent_time = timezone.now()
+    notification.save(update_fields=['attempts', 'status', 'provider_reference', 'sent_time', 'last_updated_time'])
+
+
+def claim_notifications(channel):
+    """
+    marks up to NOTIFICATION_DISPATCH_LIMIT queued notifications of a
+    channel as sending and commits, so no other worker picks them and
+    the provider calls that follow hold no transaction or row locks.
+    Claims older than NOTIFICATION_CLAIM_TIMEOUT belong to a worker
+    that died mid batch and are taken over
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True).filter(
+                Q(status="pending") | Q(status="sending", last_updated_time__lt=stale),
+                channel=channel,
+                attempts=0
+            ).order_by('id').values_list('id', flat=True)[:settings.NOTIFICATION_DISPATCH_LIMIT]
+        )
+        Notification.objects.filter(id__in=ids).update(status="sending", last_updated_time=now)
+    return list(Notification.objects.filter(id__in=ids).order_by('id'))
+
+
+@background(schedule=0, queue='notifications')
+def dispatch_notifications(channel):
+    """
+    sends every notification of a channel queued during the batch window
+    in one go, SMS in grouped provider calls and email over one pooled
+    connection, failures fall back to deliver_notification and its retries
+    """
+    notifications = claim_notifications(channel)
+    if not notifications:
+        return
+    if channel == "sms":
+        results = send_sms_batch(notifications)
+    else:
+        results = send_email_batch(notifications)
+
+    sent_time = timezone.now()
+    with transaction.atomic():
+        for notification in notifications:
+            success, detail = results[notification.id]
+            notification.attempts = 1
+            if success:
+                notification.status = "sent"
+                notification.provider_reference = detail
+                notification.sent_time = sent_time
+            else:
+                notification.status = "pending"
+                notification.last_error = detail
+                transaction.on_commit(
+                    lambda id=notification.id: deliver_notification(
+                        id,
+                        schedule=batch_window(channel)
+                    )
+                )
+            notification.last_updated_time = sent_time
+        Notification.objects.bulk_update(
+            notifications,
+            ['attempts', 'status', 'provider_reference', 'last_error', 'sent_time', 'last_updated_time']
+        )
+
+
+@background(schedule=0)
+def sweep_expired_otps():
+    clear_expired_otps()
+
+
+@background(schedule=0)
+def sweep_abandoned_uploads():
+    clear_abandoned_uploads()
+
+
+@background(schedule=0, queue='images')
+def process_image(digest):
+    """
+    generates the resized variants of an uploaded image and copies
+    them onto every user pointing at it
+    """
+    asset = ImageAsset.objects.filter(digest=digest).first()
+    if asset is None:
+        return
+    asset.variants = build_variants(asset)
+    asset.save(update_fields=['variants'])
+    for user in User.objects.filter(image_asset=asset):
+        user.image_variants = asset.variants
+        user.save(update_fields=['image_variants', 'last_updated_time'])
+
+
+@background(schedule=0, queue='geocoding')
+def geocode_pending_users():
+    """
+    geocodes one batch of moved users and schedules itself again while
+    more are waiting, after GEOCODE_BATCH_WINDOW or a longer retry
+    delay when the geocoder failed
+    """
+    processed, failed = geocode_batch()
+    if failed:
+        geocode_pending_users(schedule=settings.GEOCODE_RETRY_DELAY)
+    elif processed >= settings.GEOCODE_BATCH_SIZE:
+        geocode_pending_users(schedule=settings.GEOCODE_BATCH_WINDOW)
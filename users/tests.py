@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import io
+import gzip
+import hashlib
+import json
+import os
+import smtplib
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+
+from background_task.models import Task
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from forge import schema
+
+from . import hashing, mail, sms
+from .metrics import registry, track_provider
+from .cache import invalidate_cached_users
+from .geocoding import FakeGeocoder, geocode_batch
+from .hashing import HashingOverloaded
+from .phone import normalize_phone_number
+from .throttling import acquire_rate_slot, client_ip
+from .serializers import (
+    PhonenumberRegistrationSerializer,
+    ProfileReadSerializer,
+    ProfileSerializer,
+    UserReadSerializer,
+    UsersSerializer,
+)
+from .index import ExistenceIndex, bump_index_writes, user_index
+from .models import *
+from .admin import EstimatedCountPaginator, activate_users, deactivate_users
+from .images import store_image
+from .importer import import_chunk
+from .pagination import KeysetPagination
+from .tasks import dispatch_notifications, process_image
+from .tokens import VersionedRefreshToken
+from .utils import OtpUnavailable, create_user_otp, encode_cursor
+
+
+@override_settings(USER_INDEX_REFRESH_INTERVAL=3600)
+class RegistrationQueryCountTests(TestCase):
+    def setUp(self):
+        user_index.warm()
+
+    def test_register_query_count(self):
+        # begin, user, profile, savepoint + otp + release, notification,
+        # commit and the background task queued on commit
+        with self.assertNumQueries(9):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/api/v1/users/register/',
+                    {'email': 'new@forge.com'}
+                )
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(email='new@forge.com')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertTrue(Otp.objects.filter(code=response.json()['otp'], user=user).exists())
+
+    def test_register_phonenumber_query_count(self):
+        with self.assertNumQueries(9):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/api/v1/users/register/phonenumber/',
+                    {'phone_number': '+254712345678'}
+                )
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(phone_number='+254712345678')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        self.assertTrue(Otp.objects.filter(code=response.json()['otp'], user=user).exists())
+
+    def test_register_existing_email(self):
+        User.objects.create(email='taken@forge.com')
+        response = self.client.post(
+            '/api/v1/users/register/',
+            {'email': 'taken@forge.com'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.count(), 1)
+
+
+class BrokenSmsProvider:
+    def send(self, message, recipients):
+        raise ConnectionError("provider unreachable")
+
+
+@override_settings(SMS_BATCH_SIZE=2)
+class SmsDispatchTests(TestCase):
+    def setUp(self):
+        sms.outbox.clear()
+        self.provider = sms.FakeSmsProvider()
+        self.provider.failing = {'+254700000005'}
+        patcher = mock.patch('users.sms._provider', self.provider)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queue(self, number, message="Your code is 1234"):
+        return Notification.objects.create(channel="sms", recipient=number, message=message)
+
+    def test_batches_by_message_and_batch_size(self):
+        for i in range(1, 4):
+            self.queue(f'+25470000000{i}')
+        self.queue('+254700000004', message="Welcome")
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch_notifications.now("sms")
+        self.assertEqual(sms.outbox, [
+            ("Your code is 1234", ['+254700000001', '+254700000002']),
+            ("Your code is 1234", ['+254700000003']),
+            ("Welcome", ['+254700000004']),
+        ])
+        for notification in Notification.objects.all():
+            self.assertEqual(notification.status, "sent")
+            self.assertEqual(notification.attempts, 1)
+            self.assertTrue(notification.provider_reference.startswith("fake-"))
+            self.assertIsNotNone(notification.sent_time)
+
+    def test_rejected_number_is_retried_alone(self):
+        sent = self.queue('+254700000001')
+        rejected = self.queue('+254700000005')
+        with self.captureOnCommitCallbacks(execute=True):
+            dispatch_notifications.now("sms")
+        sent.refresh_from_db()
+        rejected.refresh_from_db()
+        self.assertEqual(sent.status, "sent")
+        self.assertEqual(rejected.status, "pending")
+        self.assertEqual(rejected.attempts, 1)
+        self.assertEqual(rejected.last_error, "InvalidPhoneNumber")
+        self.assertEqual(Task.objects.filter(task_name='users.tasks.deliver_notification').count(), 1)
+
+    def test_provider_error_fails_the_chunk(self):
+        self.queue('+254700000001')
+        self.queue('+254700000002')
+        with mock.patch('users.sms._provider', BrokenSmsProvider()):
+            with self.captureOnCommitCallbacks(execute=True):
+                dispatch_notifications.now("sms")
+        for notification in Notification.objects.all():
+            self.assertEqual(notification.status, "pending")
+            self.assertEqual(notification.last_error, "provider unreachable")
+        self.assertEqual(Task.objects.filter(task_name='users.tasks.deliver_notification').count(), 2)
+
+    @override_settings(NOTIFICATION_CLAIM_TIMEOUT=60)
+    def test_claimed_notifications_are_skipped_until_stale(self):
+        claimed = self.queue('+254700000001')
+        stale = self.queue('+254700000002')
+        Notification.objects.filter(id=claimed.id).update(status="sending")
+        Notification.objects.filter(id=stale.id).update(
+            status="sending",
+            last_updated_time=timezone.now() - timedelta(minutes=5)
+        )
+        dispatch_notifications.now("sms")
+        self.assertEqual(sms.outbox, [("Your code is 1234", ['+254700000002'])])
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, "sending")
+
+
+def smtp_connection(noop=(250, b"OK")):
+    connection = mock.Mock()
+    connection.noop.return_value = noop
+    return connection
+
+
+@override_settings(
+    EMAIL_BACKEND='users.mail.PooledEmailBackend',
+    EMAIL_HOST='smtp.forge.test',
+    EMAIL_HOST_USER='forge',
+    EMAIL_HOST_PASSWORD='secret',
+    EMAIL_POOL_SIZE=1,
+    EMAIL_POOL_MAX_IDLE=60,
+    EMAIL_POOL_TIMEOUT=0,
+    EMAIL_BATCH_SIZE=2
+)
+class PooledEmailTests(TestCase):
+    def setUp(self):
+        mail._pools.clear()
+        patcher = mock.patch('smtplib.SMTP', side_effect=lambda *args, **kwargs: smtp_connection())
+        self.smtp = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_checkout_reuses_healthy_connection(self):
+        pool = mail.ConnectionPool(1, 60)
+        connection = smtp_connection()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        connection.noop.assert_called_once()
+        self.assertIsNone(pool.checkout())
+
+    def test_checkout_discards_failed_noop(self):
+        pool = mail.ConnectionPool(1, 60)
+        refused = smtp_connection(noop=(421, b"closing"))
+        dropped = smtp_connection()
+        dropped.noop.side_effect = smtplib.SMTPServerDisconnected()
+        pool.checkin(refused)
+        pool.checkin(dropped)
+        self.assertIsNone(pool.checkout())
+        refused.quit.assert_called_once()
+        dropped.quit.assert_called_once()
+
+    def test_checkout_evicts_idle_connection(self):
+        pool = mail.ConnectionPool(1, 60)
+        connection = smtp_connection()
+        with mock.patch('users.mail.time.monotonic', return_value=1000):
+            pool.checkin(connection)
+        with mock.patch('users.mail.time.monotonic', return_value=1061):
+            self.assertIsNone(pool.checkout())
+        connection.noop.assert_not_called()
+        connection.quit.assert_called_once()
+
+    def test_backend_returns_connection_to_pool(self):
+        first = mail.PooledEmailBackend()
+        first.open()
+        connection = first.connection
+        first.close()
+        connection.quit.assert_not_called()
+        second = mail.PooledEmailBackend()
+        second.open()
+        self.assertIs(second.connection, connection)
+        self.assertEqual(self.smtp.call_count, 1)
+        second.close()
+
+    def test_backend_waits_for_a_free_slot(self):
+        holder = mail.PooledEmailBackend()
+        holder.open()
+        with self.assertRaises(smtplib.SMTPException):
+            mail.PooledEmailBackend().open()
+        holder.close()
+        waiter = mail.PooledEmailBackend()
+        self.assertTrue(waiter.open())
+        self.assertEqual(self.smtp.call_count, 1)
+        waiter.close()
+
+    def test_backend_reconnects_after_send_failure(self):
+        backend = mail.PooledEmailBackend()
+        backend.open()
+        broken = backend.connection
+        broken.sendmail.side_effect = smtplib.SMTPServerDisconnected()
+        message = mail.EmailMessage("Hi", "Body", "support@forge.com", ["a@forge.com"])
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            backend.send_messages([message])
+        broken.quit.assert_called_once()
+        self.assertIsNone(backend.connection)
+        self.assertEqual(backend.send_messages([message]), 1)
+        self.assertEqual(self.smtp.call_count, 2)
+
+    def test_batch_sends_chunks_on_one_connection(self):
+        notifications = [
+            Notification.objects.create(channel="email", recipient=f"user{i}@forge.com", message="Hi")
+            for i in range(3)
+        ]
+        with mock.patch.object(
+            mail.PooledEmailBackend, 'send_messages', autospec=True,
+            side_effect=mail.PooledEmailBackend.send_messages
+        ) as send_messages:
+            results = mail.send_email_batch(notifications)
+        self.assertEqual([len(call.args[1]) for call in send_messages.call_args_list], [2, 1])
+        self.assertEqual(self.smtp.call_count, 1)
+        self.assertEqual(results, {n.id: (True, None) for n in notifications})
+
+    def test_batch_keeps_messages_sent_before_a_failure(self):
+        first, second = [
+            Notification.objects.create(channel="email", recipient=f"user{i}@forge.com", message="Hi")
+            for i in range(2)
+        ]
+        connection = smtp_connection()
+        connection.sendmail.side_effect = [{}, smtplib.SMTPServerDisconnected("gone")]
+        self.smtp.side_effect = lambda *args, **kwargs: connection
+        results = mail.send_email_batch([first, second])
+        self.assertEqual(results[first.id], (True, None))
+        self.assertEqual(results[second.id], (False, "gone"))
+
+
+@override_settings(
+    PASSWORD_HASHING_WORKERS=0,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+)
+class OtpTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='otp@forge.com')
+        self.otp = create_user_otp(self.user)
+
+    def set_password(self, otp):
+        return self.client.post(
+            '/api/v1/users/otp/set/password/',
+            {'otp_code': otp, 'password': 'n3w-Passw0rd', 'password2': 'n3w-Passw0rd'},
+            content_type='application/json'
+        )
+
+    def test_confirm_does_not_consume(self):
+        for _ in range(2):
+            response = self.client.post('/api/v1/users/otp/confirm/', {'otp_code': self.otp})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['exists'])
+
+    def test_set_password_consumes_once(self):
+        response = self.set_password(self.otp)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('n3w-Passw0rd'))
+        self.assertFalse(Otp.objects.filter(code=self.otp).exists())
+        response = self.set_password(self.otp)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"otp_code": ["OTP code entered does not exist."]})
+
+    def test_expired_otp_is_rejected(self):
+        Otp.objects.filter(code=self.otp).update(expiry_time=timezone.now() - timedelta(seconds=1))
+        response = self.client.post('/api/v1/users/otp/confirm/', {'otp_code': self.otp})
+        self.assertEqual(response.status_code, 400)
+        response = self.set_password(self.otp)
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.check_password('n3w-Passw0rd'))
+
+    def test_overloaded_hashing_keeps_otp(self):
+        with mock.patch('users.async_views.amake_password', side_effect=HashingOverloaded()):
+            response = self.set_password(self.otp)
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(Otp.objects.filter(code=self.otp).exists())
+        self.assertEqual(self.set_password(self.otp).status_code, 200)
+
+    def test_collisions_give_up_after_max_attempts(self):
+        other = User.objects.create(email='other@forge.com')
+        with mock.patch('users.utils.generate_otp', return_value=self.otp) as generate, \
+                override_settings(OTP_MAX_ATTEMPTS=3):
+            with self.assertRaises(OtpUnavailable):
+                create_user_otp(other)
+            self.assertEqual(generate.call_count, 3)
+            response = self.client.post('/api/v1/users/register/', {'email': 'new@forge.com'})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(User.objects.filter(email='new@forge.com').exists())
+
+    def test_new_otp_replaces_previous(self):
+        replacement = create_user_otp(self.user)
+        self.assertEqual(self.set_password(self.otp).status_code, 400)
+        self.assertEqual(self.set_password(replacement).status_code, 200)
+
+
+class HashingPoolTests(TestCase):
+    def setUp(self):
+        pool = (hashing._executor, hashing._slots)
+        hashing._executor = hashing._slots = None
+
+        def restore():
+            if hashing._executor is not None:
+                hashing._executor.shutdown()
+            hashing._executor, hashing._slots = pool
+        self.addCleanup(restore)
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000, PASSWORD_HASHING_WORKERS=1)
+    def test_workers_use_the_parent_iteration_count(self):
+        encoded = hashing.make_password('n3w-Passw0rd')
+        self.assertEqual(encoded.split('$')[1], '1000')
+        self.assertTrue(hashing.check_password('n3w-Passw0rd', encoded))
+
+class AuthenticatedTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='member@forge.com', full_name='Member')
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        self.refresh = VersionedRefreshToken.for_user(user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {self.refresh.access_token}"
+
+
+def user_table_queries(queries):
+    table = connection.ops.quote_name(User._meta.db_table)
+    return [q for q in queries if f"FROM {table}" in q['sql']]
+
+
+class CachedAuthenticationTests(AuthenticatedTestCase):
+    def test_user_is_read_from_cache(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 200)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 200)
+        self.assertEqual(len(user_table_queries(first.captured_queries)), 1)
+        self.assertEqual(user_table_queries(second.captured_queries), [])
+
+    def test_save_invalidates_cached_user(self):
+        self.client.get('/api/v1/users/user/')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/v1/users/user/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_bulk_invalidation(self):
+        self.client.get('/api/v1/users/user/')
+        User.objects.filter(id=self.user.id).update(full_name='Renamed')
+        invalidate_cached_users([self.user.id])
+        response = self.client.get('/api/v1/users/user/')
+        self.assertEqual(response.json()['full_name'], 'Renamed')
+
+
+
+class TokenRevocationTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.set_password('0ld-Passw0rd')
+        self.user.save()
+        self.authenticate(self.user)
+
+    def test_logout_rejects_old_token(self):
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 200)
+        self.assertEqual(self.client.post('/api/v1/users/user/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 401)
+
+    def test_password_change_rejects_old_token(self):
+        old = self.client.defaults['HTTP_AUTHORIZATION']
+        response = self.client.post('/api/v1/users/user/password/change/', {
+            'old_password': '0ld-Passw0rd', 'password': 'n3w-Passw0rd', 'password2': 'n3w-Passw0rd'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/users/user/', HTTP_AUTHORIZATION=old).status_code, 401)
+        new = f"Bearer {response.json()['access']}"
+        self.assertEqual(self.client.get('/api/v1/users/user/', HTTP_AUTHORIZATION=new).status_code, 200)
+
+    def test_otp_password_reset_rejects_old_token(self):
+        response = self.client.post(
+            '/api/v1/users/otp/set/password/',
+            {'otp_code': create_user_otp(self.user), 'password': 'n3w-Passw0rd', 'password2': 'n3w-Passw0rd'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 401)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('n3w-Passw0rd'))
+
+    def test_refresh_of_revoked_token_is_refused(self):
+        refresh = str(self.refresh)
+        self.user.revoke_tokens()
+        response = self.client.post('/api/v1/auth/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_concurrent_revocations_both_count(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.revoke_tokens()
+        stale.revoke_tokens()
+        self.assertEqual(stale.token_version, 2)
+        self.assertEqual(User.objects.get(pk=self.user.pk).token_version, 2)
+
+    def test_stale_save_does_not_restore_old_version(self):
+        # a PATCH that read the user before the logout finishes after it
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.revoke_tokens()
+        serializer = UsersSerializer(stale, data={'full_name': 'Renamed'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        stale.save()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.token_version, 1)
+        self.assertEqual(user.full_name, 'Renamed')
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 401)
+
+@override_settings(USER_INDEX_WATERMARK_LAG=timedelta(seconds=60))
+class ExistenceIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(email='first@forge.com')
+        self.index = ExistenceIndex()
+        self.index.warm()
+
+    def expire(self):
+        self.index.refreshed_at = 0
+
+    def test_refresh_picks_up_rows_committed_behind_the_watermark(self):
+        # bulk_create skips post_save like a write from another process,
+        # the timestamp stands in for a late commit or a lagging clock
+        User.objects.bulk_create([User(email='late@forge.com')])
+        User.objects.filter(email='late@forge.com').update(
+            last_updated_time=self.index.watermark - timedelta(seconds=30)
+        )
+        self.assertFalse(self.index.contains("email", "late@forge.com"))
+        self.expire()
+        self.assertTrue(self.index.might_exist("email", "late@forge.com"))
+
+    def test_refresh_does_not_recount_known_rows(self):
+        count = self.index.bloom.count
+        for _ in range(3):
+            self.expire()
+            self.index.refresh()
+        self.assertEqual(self.index.bloom.count, count)
+
+    def test_waiting_refresh_reuses_the_running_one(self):
+        self.expire()
+        holding = threading.Event()
+        release = threading.Event()
+
+        def refresh_elsewhere():
+            with self.index.refresh_lock:
+                holding.set()
+                release.wait()
+                self.index.refreshed_at = time.monotonic()
+
+        holder = threading.Thread(target=refresh_elsewhere)
+        holder.start()
+        holding.wait()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self.index.refresh()))
+        with mock.patch('users.index.cache') as shared_cache:
+            waiter.start()
+            release.set()
+            holder.join()
+            waiter.join()
+        self.assertEqual(results, [True])
+        shared_cache.get.assert_not_called()
+
+    def test_miss_is_rechecked_after_a_write_elsewhere(self):
+        # another worker's insert reaches this filter only through the counter
+        User.objects.bulk_create([User(email='elsewhere@forge.com')])
+        self.assertTrue(self.index.is_fresh())
+        self.assertFalse(self.index.might_exist("email", "elsewhere@forge.com"))
+        bump_index_writes()
+        self.assertTrue(self.index.might_exist("email", "elsewhere@forge.com"))
+        self.assertTrue(self.index.is_current())
+
+    def test_committed_save_bumps_the_write_counter(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create(email='second@forge.com')
+        self.assertFalse(self.index.is_current())
+
+    def test_current_miss_skips_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(self.index.might_exist("email", "nobody@forge.com"))
+
+    def test_lookups_use_the_database_while_warming(self):
+        index = ExistenceIndex()
+        started, release = threading.Event(), threading.Event()
+
+        def warm():
+            started.set()
+            release.wait()
+
+        with mock.patch.object(index, 'warm', side_effect=warm):
+            index.warm_in_background()
+            started.wait()
+            self.assertTrue(index.might_exist("email", "nobody@forge.com"))
+            release.set()
+        while index.warming:
+            time.sleep(0.01)
+
+
+@override_settings(PHONE_REGION_CODE='254')
+class PhoneNumberTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_normalizes_to_e164(self):
+        for value in ('0712 345 678', '+254 712-345-678', '00254712345678', '254712345678', '(0712) 345.678'):
+            self.assertEqual(normalize_phone_number(value), '+254712345678')
+
+    def test_rejects_non_numbers(self):
+        for value in ('', None, '12', 'not a number', '+0712345678', '+2547123456789012'):
+            self.assertIsNone(normalize_phone_number(value))
+
+    def test_field_returns_e164(self):
+        serializer = PhonenumberRegistrationSerializer(data={'phone_number': '0712 345 678'})
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['phone_number'], '+254712345678')
+        serializer = PhonenumberRegistrationSerializer(data={'phone_number': 'abc'})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['phone_number'], ['Enter a valid phone number.'])
+
+    def test_model_stores_e164(self):
+        user = User.objects.create(email='phone@forge.com', phone_number='0712-345-678')
+        self.assertEqual(user.phone_number, '+254712345678')
+        user = User.objects.create(email='nophone@forge.com', phone_number='')
+        self.assertIsNone(user.phone_number)
+
+    def test_invalid_numbers_are_not_stored(self):
+        with self.assertRaises(ValidationError):
+            User.objects.create(email='phone@forge.com', phone_number='not a number')
+        user = User(email='phone@forge.com', phone_number='12')
+        with self.assertRaises(ValidationError) as raised:
+            user.full_clean()
+        self.assertIn('phone_number', raised.exception.message_dict)
+
+    def test_user_serializer_normalizes_and_rejects(self):
+        User.objects.create(email='taken@forge.com', phone_number='+254712345678')
+        user = User.objects.create(email='phone@forge.com')
+        serializer = UsersSerializer(user, data={'phone_number': 'abc'}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['phone_number'], ['Enter a valid phone number.'])
+        serializer = UsersSerializer(user, data={'phone_number': '0712 345 678'}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        serializer = UsersSerializer(user, data={'phone_number': '0722 345 678'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.save().phone_number, '+254722345678')
+
+    def test_national_form_matches_registered_number(self):
+        User.objects.create(email='phone@forge.com', phone_number='+254712345678')
+        response = self.client.post('/api/v1/users/register/phonenumber/', {'phone_number': '0712345678'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/users/otp/phone/resend/', {'phone_number': '0712 345 678'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ImportUsersTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'users.jsonl')
+        User.objects.create(email='existing@forge.com')
+        rows = [
+            {'email': 'one@forge.com', 'full_name': 'One'},
+            {'email': 'existing@forge.com'},
+            {'email': 'one@forge.com'},
+            {'email': 'not-an-email'},
+            {'email': 'two@forge.com', 'phone_number': '0712345678'},
+            {'email': 'long@forge.com', 'full_name': 'A name far past fifteen characters'},
+        ]
+        with open(self.path, 'w') as f:
+            for row in rows[:2]:
+                f.write(json.dumps(row) + "\n")
+            f.write('{"email": "broken@forge.com",\n')
+            f.write('[1, 2]\n')
+            for row in rows[2:]:
+                f.write(json.dumps(row) + "\n")
+
+    def run_import(self, **options):
+        out = io.StringIO()
+        call_command('import_users', self.path, stdout=out, stderr=io.StringIO(), **options)
+        return out.getvalue()
+
+    def test_reports_inserted_skipped_and_invalid(self):
+        output = self.run_import(batch_size=3)
+        self.assertIn("Imported 2 rows, skipped 2 existing or duplicate, 4 invalid", output)
+        self.assertEqual(
+            set(User.objects.values_list('email', flat=True)),
+            {'existing@forge.com', 'one@forge.com', 'two@forge.com'}
+        )
+        self.assertEqual(User.objects.get(email='two@forge.com').phone_number, '+254712345678')
+        self.assertEqual(Profile.objects.count(), 3)
+
+    def test_rows_that_do_not_fit_the_columns_are_errors(self):
+        index, inserted, skipped, errors = import_chunk(0, [
+            {'email': 'long@forge.com', 'full_name': 'A name far past fifteen characters'},
+            {'email': 'device@forge.com', 'device_id': 'x' * 300},
+        ])
+        self.assertEqual((inserted, skipped), (0, 0))
+        self.assertEqual([email for email, _ in errors], ['long@forge.com', 'device@forge.com'])
+        self.assertTrue(errors[0][1].startswith('full_name: '))
+        self.assertFalse(User.objects.filter(email__in=['long@forge.com', 'device@forge.com']).exists())
+
+    def test_resume_skips_finished_chunks(self):
+        self.run_import(batch_size=3)
+        output = self.run_import(batch_size=3)
+        self.assertIn("Resuming, 3 chunks already imported", output)
+        self.assertIn("Imported 0 rows, skipped 0 existing or duplicate, 0 invalid", output)
+
+    def test_resume_refuses_other_batch_size(self):
+        self.run_import(batch_size=3)
+        with self.assertRaisesMessage(CommandError, "different batch size"):
+            self.run_import(batch_size=2)
+
+    def test_resume_refuses_changed_file(self):
+        self.run_import(batch_size=3)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'email': 'three@forge.com'}) + "\n")
+        with self.assertRaisesMessage(CommandError, "different file"):
+            self.run_import(batch_size=3)
+
+
+def metric(name, labels):
+    prefix = f"{name}{{{labels}}} "
+    for line in registry.render().splitlines():
+        if line.startswith(prefix):
+            return float(line[len(prefix):])
+    return 0
+
+
+class MetricsTests(AuthenticatedTestCase):
+    def test_requests_are_recorded_by_route(self):
+        labels = 'route="email-check"'
+        count = metric("forge_request_duration_seconds_count", labels)
+        queries = metric("forge_request_queries_total", labels)
+        self.client.post('/api/v1/users/email/check/', {'email': 'nobody@forge.com'})
+        self.client.post('/api/v1/users/email/check/', {'email': 'member@forge.com'})
+        self.assertEqual(metric("forge_request_duration_seconds_count", labels), count + 2)
+        self.assertGreater(metric("forge_request_queries_total", labels), queries)
+        self.assertEqual(
+            metric("forge_request_duration_seconds_bucket", f'{labels},le="+Inf"'),
+            count + 2
+        )
+
+    def test_provider_calls_and_errors(self):
+        labels = 'provider="sms"'
+        calls = metric("forge_provider_calls_total", labels)
+        errors = metric("forge_provider_errors_total", labels)
+        with track_provider("sms"):
+            pass
+        with self.assertRaises(ConnectionError):
+            with track_provider("sms"):
+                raise ConnectionError()
+        self.assertEqual(metric("forge_provider_calls_total", labels), calls + 2)
+        self.assertEqual(metric("forge_provider_errors_total", labels), errors + 1)
+
+    def test_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get('/api/v1/users/metrics/').status_code, 403)
+        User.objects.filter(id=self.user.id).update(is_admin=True)
+        invalidate_cached_users([self.user.id])
+        response = self.client.get('/api/v1/users/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(b'forge_request_duration_seconds_bucket{route="metrics"', response.content)
+
+
+class ReadSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            email='reader@forge.com',
+            full_name='Reader',
+            phone_number='+254712345678',
+            gender='Male',
+            age=30,
+            latitude=-1.2921,
+            longitude=36.8219,
+            image='users/originals/ab/abc.png',
+            image_variants={'64': {'webp': 'users/variants/ab/abc/64.webp'}},
+            last_login=timezone.now()
+        )
+        self.profile = Profile.objects.select_related('user').get(user=self.user)
+        self.profile.document = 'profile/2024/01/cv.pdf'
+        self.request = RequestFactory().get('/')
+
+    def test_user_matches_model_serializer(self):
+        expected = UsersSerializer(self.user, context={'request': self.request}).data
+        data = UserReadSerializer(self.user, context={'request': self.request}).data
+        internal = {'password', 'image_asset', 'geohash', 'geocode_pending', 'geocode_claim_time', 'token_version'}
+        self.assertEqual(set(data), set(expected) - internal)
+        for name in set(data) - {'image_variants'}:
+            self.assertEqual(data[name], expected[name], name)
+        self.assertEqual(
+            data['image_variants'],
+            {'64': {'webp': 'http://testserver/media/users/variants/ab/abc/64.webp'}}
+        )
+
+    def test_profile_matches_model_serializer(self):
+        expected = ProfileSerializer(self.profile, context={'request': self.request}).data
+        data = ProfileReadSerializer(self.profile, context={'request': self.request}).data
+        self.assertEqual(set(data), set(expected))
+        self.assertEqual(data['document'], expected['document'])
+        self.assertEqual(data['creation_time'], expected['creation_time'])
+        self.assertEqual(data['user']['email'], expected['user']['email'])
+        self.assertNotIn('password', data['user'])
+
+    def test_relative_urls_without_request(self):
+        data = UserReadSerializer.represent(self.user)
+        self.assertEqual(data['image'], '/media/users/originals/ab/abc.png')
+        User.objects.filter(id=self.user.id).update(image='')
+        self.user.refresh_from_db()
+        self.assertIsNone(UserReadSerializer.represent(self.user)['image'])
+
+
+class ConditionalRequestTests(AuthenticatedTestCase):
+    def test_user_not_modified(self):
+        response = self.client.get('/api/v1/users/user/')
+        etag = response['ETag']
+        response = self.client.get('/api/v1/users/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/api/v1/users/user/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_user_patch_requires_current_etag(self):
+        etag = self.client.get('/api/v1/users/user/')['ETag']
+        response = self.client.patch(
+            '/api/v1/users/user/', {'full_name': 'First'},
+            content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.patch(
+            '/api/v1/users/user/', {'full_name': 'Second'},
+            content_type='application/json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.full_name, 'First')
+        response = self.client.get('/api/v1/users/user/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_not_modified_until_user_changes(self):
+        etag = self.client.get('/api/v1/users/user/profile/')['ETag']
+        response = self.client.get('/api/v1/users/user/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.patch('/api/v1/users/user/', {'full_name': 'Changed'}, content_type='application/json')
+        response = self.client.get('/api/v1/users/user/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_patch_requires_current_etag(self):
+        profile = Profile.objects.get(user=self.user)
+        url = f'/api/v1/users/user/profile/modify/{profile.id}/'
+        etag = self.client.get('/api/v1/users/user/profile/')['ETag']
+        response = self.client.patch(url, {}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        current = response['ETag']
+        self.assertNotEqual(current, etag)
+        response = self.client.patch(url, {}, content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        response = self.client.get('/api/v1/users/user/profile/', HTTP_IF_NONE_MATCH=current)
+        self.assertEqual(response.status_code, 304)
+
+
+def png_upload(name='avatar.png', color=(200, 30, 30), size=(300, 200)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class MediaTestCase(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name, FILE_UPLOAD_TEMP_DIR=None)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media_root = directory.name
+
+
+@override_settings(IMAGE_VARIANT_SIZES=(64, 256), IMAGE_VARIANT_FORMATS=('webp', 'jpeg'))
+class ImageTests(MediaTestCase):
+    def test_same_content_is_stored_once(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            first = store_image(png_upload('one.png'))
+        self.assertEqual(len(callbacks), 1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            second = store_image(png_upload('two.png'))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(first.digest, second.digest)
+        self.assertEqual(ImageAsset.objects.count(), 1)
+        self.assertTrue(default_storage.exists(first.original.name))
+        third = store_image(png_upload('three.png', color=(0, 0, 255)))
+        self.assertNotEqual(third.digest, first.digest)
+
+    def test_variants_are_built_off_the_request(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                '/api/v1/users/user/',
+                encode_multipart(BOUNDARY, {'image': png_upload()}),
+                content_type=MULTIPART_CONTENT
+            )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        asset = self.user.image_asset
+        self.assertEqual(self.user.image_variants, {})
+        self.assertTrue(Task.objects.filter(task_name='users.tasks.process_image').exists())
+
+        process_image.now(asset.digest)
+        self.user.refresh_from_db()
+        self.assertEqual(set(self.user.image_variants), {'64', '256'})
+        self.assertEqual(set(self.user.image_variants['64']), {'webp', 'jpeg'})
+        from PIL import Image
+        with default_storage.open(self.user.image_variants['64']['webp']) as f:
+            self.assertEqual(max(Image.open(f).size), 64)
+        response = self.client.get('/api/v1/users/user/')
+        self.assertTrue(response.json()['image_variants']['256']['jpeg'].endswith('/256.jpeg'))
+
+
+class ChunkedUploadTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        uploads = override_settings(CHUNKED_UPLOAD_DIR=os.path.join(self.media_root, 'parts'))
+        uploads.enable()
+        self.addCleanup(uploads.disable)
+        self.content = os.urandom(10000)
+        response = self.client.post('/api/v1/users/user/profile/uploads/', {
+            'filename': 'cv.pdf',
+            'size': len(self.content),
+            'checksum': hashlib.sha256(self.content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.url = f"/api/v1/users/user/profile/uploads/{response.json()['id']}/"
+
+    def put(self, offset, chunk, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum is not None:
+            headers['HTTP_UPLOAD_CHECKSUM'] = checksum
+        return self.client.put(self.url, chunk, content_type='application/octet-stream', **headers)
+
+    def test_resumes_from_reported_offset(self):
+        first, second = self.content[:6000], self.content[6000:]
+        response = self.put(0, first, hashlib.sha256(first).hexdigest())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Upload-Offset'], '6000')
+
+        response = self.client.get(self.url)
+        self.assertEqual(response['Upload-Offset'], '6000')
+        self.assertEqual(self.client.post(f"{self.url}finalize/").status_code, 409)
+
+        response = self.put(0, second)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 6000)
+
+        response = self.put(6000, second)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(f"{self.url}finalize/")
+        self.assertEqual(response.status_code, 200)
+        profile = Profile.objects.get(user=self.user)
+        with profile.document.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(ChunkedUpload.objects.get().status, "complete")
+        self.assertEqual(self.put(10000, b'x').status_code, 409)
+
+    def test_bad_chunk_checksum_keeps_offset(self):
+        chunk = self.content[:4000]
+        response = self.put(0, chunk, hashlib.sha256(b'other').hexdigest())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(self.client.get(self.url)['Upload-Offset'], '0')
+        self.assertEqual(self.put(0, chunk, hashlib.sha256(chunk).hexdigest()).status_code, 200)
+
+    def test_file_checksum_mismatch_discards_upload(self):
+        corrupted = bytes([self.content[0] ^ 1]) + self.content[1:]
+        self.assertEqual(self.put(0, corrupted).status_code, 200)
+        response = self.client.post(f"{self.url}finalize/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(Profile.objects.get(user=self.user).document)
+
+    def test_chunk_past_size_is_refused(self):
+        response = self.put(0, self.content + b'extra')
+        self.assertEqual(response.status_code, 413)
+
+    def test_uploads_are_private(self):
+        other = User.objects.create(email='other@forge.com')
+        self.authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.put(0, self.content).status_code, 404)
+
+
+class NearbyUsersTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.latitude, self.user.longitude = -1.2921, 36.8219
+        self.user.save()
+        for i, offset in enumerate((0.001, 0.002, 0.003)):
+            User.objects.create(email=f'near{i}@forge.com', latitude=-1.2921 + offset, longitude=36.8219)
+        User.objects.create(email='far@forge.com', latitude=-4.0435, longitude=39.6682)
+
+    def test_pages_closest_first(self):
+        response = self.client.get('/api/v1/users/user/nearby/', {'radius': 5, 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        first = response.json()
+        self.assertEqual([user['distance'] for user in first['results']], [0.111, 0.222])
+        response = self.client.get(first['next'])
+        second = response.json()
+        self.assertEqual([user['distance'] for user in second['results']], [0.334])
+        self.assertIsNone(second['next'])
+
+    def test_non_finite_values_are_rejected(self):
+        for params in ({'radius': 'nan'}, {'radius': 'inf'}, {'radius': '-inf'}, {'cursor': encode_cursor(float('nan'), 1)}):
+            response = self.client.get('/api/v1/users/user/nearby/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json(), {"message": "radius, limit or cursor is invalid"})
+
+    def test_bench_nearby_seeds_every_column(self):
+        # the command normally builds its own test database, this one is reused
+        out = io.StringIO()
+        command = 'users.management.commands.bench_nearby'
+        with mock.patch(f'{command}.setup_test_environment'), \
+                mock.patch(f'{command}.setup_databases'), mock.patch(f'{command}.teardown_databases'):
+            call_command('bench_nearby', users=50, queries=4, scans=1, stdout=out)
+        self.assertIn("Seeded 50 users", out.getvalue())
+        seeded = User.objects.filter(email__endswith='@bench.forge.com')
+        self.assertEqual(seeded.count(), 50)
+        self.assertFalse(seeded.exclude(geohash__isnull=False).exists())
+        self.assertEqual(seeded.filter(token_version=0, geocode_pending=False).count(), 50)
+
+
+class FailingGeocoder(FakeGeocoder):
+    def reverse(self, latitude, longitude):
+        raise TimeoutError("geocoder timed out")
+
+
+@override_settings(GEOCODE_CLAIM_TIMEOUT=timedelta(minutes=10), GEOCODE_PRECISION=4)
+class GeocodeBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.geocoder = FakeGeocoder()
+        self.geocoder.calls = []
+        patcher = mock.patch('users.geocoding._geocoder', self.geocoder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = [
+            User.objects.create(email=f'moved{i}@forge.com', latitude=-1.29 - i / 100, longitude=36.82)
+            for i in range(3)
+        ]
+
+    def test_claimed_users_are_left_to_their_worker(self):
+        claimed, stale, free = self.users
+        User.objects.filter(id=claimed.id).update(geocode_claim_time=timezone.now())
+        User.objects.filter(id=stale.id).update(geocode_claim_time=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(geocode_batch(), (2, 0))
+        self.assertEqual(len(self.geocoder.calls), 2)
+        claimed.refresh_from_db()
+        self.assertTrue(claimed.geocode_pending)
+        for user in (stale, free):
+            user.refresh_from_db()
+            self.assertFalse(user.geocode_pending)
+            self.assertIsNone(user.geocode_claim_time)
+            self.assertTrue(user.formater_address.startswith("Near "))
+
+    def test_failed_lookups_are_released(self):
+        with mock.patch('users.geocoding._geocoder', FailingGeocoder()):
+            self.assertEqual(geocode_batch(), (3, 3))
+        self.assertFalse(User.objects.filter(geocode_claim_time__isnull=False).exists())
+        self.assertEqual(User.objects.filter(geocode_pending=True).count(), 3)
+        self.assertEqual(geocode_batch(), (3, 0))
+
+    def test_cached_addresses_skip_the_geocoder(self):
+        geocode_batch()
+        User.objects.create(email='neighbour@forge.com', latitude=-1.29, longitude=36.82)
+        self.assertEqual(geocode_batch(), (1, 0))
+        self.assertEqual(len(self.geocoder.calls), 3)
+
+
+class SharedRateSlotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def acquire(self, now, rate):
+        with mock.patch('users.throttling.time.time', return_value=now), \
+                mock.patch('users.throttling.time.sleep') as sleep:
+            acquire_rate_slot("test", rate)
+        return round(sleep.call_args.args[0], 6)
+
+    def test_calls_are_spaced_across_processes(self):
+        # every caller shares the cache, as workers in separate processes do
+        self.assertEqual(self.acquire(100.9, 1), 0.1)
+        self.assertEqual(self.acquire(100.95, 1), 1.05)
+        self.assertEqual(self.acquire(101.5, 1), 1.5)
+
+    def test_budget_per_window(self):
+        self.assertEqual(self.acquire(100.5, 2), 0.5)
+        self.assertEqual(self.acquire(100.5, 2), 0.5)
+        self.assertEqual(self.acquire(100.5, 2), 1.5)
+
+    def test_slow_rates_use_longer_windows(self):
+        self.assertEqual(self.acquire(100.0, 0.25), 4.0)
+        self.assertEqual(self.acquire(100.0, 0.25), 8.0)
+
+
+@override_settings(
+    RATE_LIMIT_ENABLED=True,
+    RATE_LIMIT_PROXY_COUNT=1,
+    RATE_LIMITS={
+        'otp-resend': {'ip': (5, 3600), 'email': (2, 600)},
+        'otp-confirm': {'ip': (2, 600)},
+    }
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create(email='limited@forge.com')
+
+    def resend(self, email, ip='10.0.0.1'):
+        return self.client.post(
+            '/api/v1/users/otp/resend/', {'email': email},
+            HTTP_X_FORWARDED_FOR=f"203.0.113.9, {ip}"
+        )
+
+    def test_sync_view_returns_429_with_retry_after(self):
+        for _ in range(2):
+            self.assertEqual(self.resend('limited@forge.com').status_code, 200)
+        response = self.resend('LIMITED@forge.com')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 1200)
+        # the email rule is per address, other addresses still go through
+        self.assertNotEqual(self.resend('other@forge.com').status_code, 429)
+
+    def test_limits_are_per_forwarded_client(self):
+        for i in range(5):
+            self.resend(f'user{i}@forge.com', ip='10.0.0.2')
+        self.assertEqual(self.resend('user5@forge.com', ip='10.0.0.2').status_code, 429)
+        self.assertNotEqual(self.resend('user5@forge.com', ip='10.0.0.3').status_code, 429)
+        # only the hop the trusted proxy appended counts, not what the client sent
+        spoofed = self.client.post(
+            '/api/v1/users/otp/resend/', {'email': 'user6@forge.com'},
+            HTTP_X_FORWARDED_FOR="10.0.0.9, 10.0.0.2"
+        )
+        self.assertEqual(spoofed.status_code, 429)
+
+    def test_client_ip_counts_hops_from_the_end(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='172.16.0.1', HTTP_X_FORWARDED_FOR='203.0.113.9, 10.0.0.1, 10.0.0.2')
+        for proxies, expected in ((0, '172.16.0.1'), (1, '10.0.0.2'), (2, '10.0.0.1'), (5, '203.0.113.9')):
+            with override_settings(RATE_LIMIT_PROXY_COUNT=proxies):
+                self.assertEqual(client_ip(request), expected)
+        request = RequestFactory().get('/', REMOTE_ADDR='172.16.0.1')
+        self.assertEqual(client_ip(request), '172.16.0.1')
+
+    def test_async_view_returns_429_with_retry_after(self):
+        for _ in range(2):
+            response = self.client.post('/api/v1/users/otp/confirm/', {'otp_code': 123456})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/v1/users/otp/confirm/', {'otp_code': 123456})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 1200)
+
+    def test_counts_are_shared_through_the_cache(self):
+        self.resend('limited@forge.com')
+        self.resend('limited@forge.com')
+        with override_settings(RATE_LIMIT_ENABLED=False):
+            self.assertEqual(self.resend('limited@forge.com').status_code, 200)
+        cache.clear()
+        self.assertEqual(self.resend('limited@forge.com').status_code, 200)
+
+
+class KeysetPaginationTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(id=self.user.id).update(is_admin=True)
+        invalidate_cached_users([self.user.id])
+        for i in range(6):
+            User.objects.create(email=f'page{i}@forge.com')
+        # a shared timestamp so the id tiebreak decides the order
+        tied = timezone.now() - timedelta(days=1)
+        User.objects.filter(email__in=['page1@forge.com', 'page2@forge.com', 'page3@forge.com']).update(creation_time=tied)
+        Profile.objects.filter(user__email__in=['page1@forge.com', 'page2@forge.com']).update(creation_time=tied)
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_users_are_paged_newest_first_without_gaps(self):
+        ids, pages = self.walk('/api/v1/users/staff/users/?limit=2')
+        expected = list(User.objects.order_by('-creation_time', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+    def test_profiles_are_paged_newest_first_without_gaps(self):
+        ids, _ = self.walk('/api/v1/users/staff/profiles/?limit=3')
+        expected = list(Profile.objects.order_by('-creation_time', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_keeps_filters_and_page_size(self):
+        response = self.client.get('/api/v1/users/staff/users/?limit=2&email=page')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIn('email=page', response.data['next'])
+        self.assertIn('limit=2', response.data['next'])
+        ids, _ = self.walk('/api/v1/users/staff/users/?limit=2&email=page')
+        expected = list(
+            User.objects.filter(email__startswith='page')
+            .order_by('-creation_time', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_cursor_round_trip(self):
+        pagination = KeysetPagination()
+        user = User.objects.get(email='page2@forge.com')
+        self.assertEqual(
+            pagination.decode_cursor(pagination.encode_cursor(user)),
+            (user.creation_time, user.id)
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('garbage', 'bm90LWEtY3Vyc29y'):
+            response = self.client.get(f'/api/v1/users/staff/users/?cursor={cursor}')
+            self.assertEqual(response.status_code, 404)
+
+    def test_staff_only(self):
+        self.authenticate(User.objects.get(email='page0@forge.com'))
+        self.assertEqual(self.client.get('/api/v1/users/staff/users/').status_code, 403)
+
+
+class SchemaDocumentTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        overrides = override_settings(SCHEMA_ROOT=self.root.name, SCHEMA_VERSION='test')
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for clear in (schema.code_version.cache_clear, schema._documents.clear):
+            clear()
+            self.addCleanup(clear)
+        generate = mock.patch.object(schema, 'generate_schema', return_value={
+            'json': b'{"swagger": "2.0"}' * 100, 'yaml': b'swagger: "2.0"\n' * 100
+        })
+        generate.start()
+        self.addCleanup(generate.stop)
+
+    def get(self, encoding=None, etag=None):
+        headers = {}
+        if encoding is not None:
+            headers['HTTP_ACCEPT_ENCODING'] = encoding
+        if etag is not None:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get('/api/v1/schema.json', **headers)
+
+    def test_build_writes_precompressed_copies(self):
+        paths = schema.build_schema()
+        self.assertIn(os.path.join(self.root.name, 'test', 'openapi.json.gz'), paths)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_encoding_follows_q_values(self):
+        self.assertEqual(self.get('gzip')['Content-Encoding'], 'gzip')
+        self.assertFalse(self.get('gzip;q=0').has_header('Content-Encoding'))
+        self.assertFalse(self.get('*;q=0, identity').has_header('Content-Encoding'))
+        self.assertFalse(self.get('identity, gzip;q=0.5').has_header('Content-Encoding'))
+        self.assertEqual(self.get('identity;q=0.2, gzip;q=0.5')['Content-Encoding'], 'gzip')
+        self.assertEqual(self.get('*')['Content-Encoding'], self.get('br, gzip')['Content-Encoding'])
+        self.assertFalse(self.get().has_header('Content-Encoding'))
+        response = self.get('gzip')
+        self.assertEqual(gzip.decompress(response.content), self.get().content)
+
+    def test_etag_differs_per_coding(self):
+        plain = self.get()['ETag']
+        gzipped = self.get('gzip')['ETag']
+        self.assertNotEqual(plain, gzipped)
+        self.assertTrue(gzipped.endswith('-gz"'))
+        self.assertEqual(self.get('gzip', gzipped).status_code, 304)
+        self.assertEqual(self.get(etag=plain).status_code, 304)
+        # a compressed variant's validator does not revalidate the plain one
+        response = self.get(etag=gzipped)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], plain)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+
+class AdminTests(AuthenticatedTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            User.objects.create(email=f'admin{i}@forge.com')
+        self.modeladmin = mock.Mock()
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=10)
+    def test_exact_count_below_the_limit(self):
+        paginator = EstimatedCountPaginator(User.objects.order_by('id'), 2)
+        self.assertEqual(paginator.count, 6)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    def test_estimated_count_above_the_limit(self):
+        # SQLite keeps no statistics, the highest id stands in for them
+        User.objects.filter(email='admin2@forge.com').delete()
+        highest = User.objects.order_by('-id').values_list('id', flat=True)[0]
+        paginator = EstimatedCountPaginator(User.objects.order_by('id'), 2)
+        self.assertEqual(paginator.count, highest)
+        # a filtered changelist has no estimate, it stops at limit + 1
+        filtered = EstimatedCountPaginator(User.objects.filter(is_active=True).order_by('id'), 2)
+        self.assertEqual(filtered.count, 4)
+
+    @override_settings(ADMIN_ACTION_BATCH_SIZE=2)
+    def test_bulk_actions_invalidate_cached_users_in_batches(self):
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 200)
+        deactivate_users(self.modeladmin, None, User.objects.filter(is_active=True))
+        self.assertFalse(User.objects.filter(is_active=True).exists())
+        self.modeladmin.message_user.assert_called_with(None, "Updated 6 users")
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 401)
+        activate_users(self.modeladmin, None, User.objects.all())
+        self.assertEqual(User.objects.filter(is_active=True).count(), 6)
+        self.assertEqual(self.client.get('/api/v1/users/user/').status_code, 200)
@@ -0,0 +1,129 @@
+import hashlib
+import math
+import time
+
+from rest_framework.throttling import BaseThrottle
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.conf import settings
+
+from .phone import normalize_phone_number
+
+
+def client_ip(request):
+    """
+    REMOTE_ADDR, or the address RATE_LIMIT_PROXY_COUNT hops from the
+    end of X-Forwarded-For when running behind that many proxies
+    """
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        return hops[max(0, len(hops) - proxies)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def identity(kind, request, data):
+    if kind == 'ip':
+        return client_ip(request)
+    if kind == 'global':
+        return 'all'
+    value = data.get(kind) if hasattr(data, 'get') else None
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    if kind == 'phone_number':
+        return normalize_phone_number(value) or value
+    return value.lower()
+
+
+def retry_after(previous, current, limit, window, elapsed):
+    """
+    seconds until the weighted count drops back under the limit
+    """
+    if current >= limit:
+        wait = window - elapsed + window * (1 - limit / (current + 1))
+    else:
+        wait = window * (1 - (limit - current) / previous) - elapsed
+    return max(1, math.ceil(wait))
+
+
+def check_rate_limit(scope, request, data):
+    """
+    counts a request against every rule of settings.RATE_LIMITS[scope]
+    and returns the seconds to wait if any rule is over its limit, else
+    None. Each rule is a sliding window approximated from the counters
+    of the current and previous fixed windows, kept in the shared cache
+    so limits hold across processes, one get_many plus one increment
+    per rule
+    """
+    rules = settings.RATE_LIMITS.get(scope)
+    if not settings.RATE_LIMIT_ENABLED or not rules:
+        return None
+    now = time.time()
+    windows = []
+    for kind, (limit, window) in rules.items():
+        value = identity(kind, request, data)
+        if value is None:
+            continue
+        digest = hashlib.blake2b(value.encode(), digest_size=12).hexdigest()
+        index = int(now // window)
+        key = f"ratelimit:{scope}:{kind}:{digest}"
+        windows.append((f"{key}:{index}", f"{key}:{index - 1}", limit, window, now - index * window))
+    counts = cache.get_many([key for current, previous, *_ in windows for key in (current, previous)])
+
+    wait = None
+    for current_key, previous_key, limit, window, elapsed in windows:
+        if current_key in counts or not cache.add(current_key, 1, window * 2):
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                cache.add(current_key, 1, window * 2)
+                current = 1
+        else:
+            current = 1
+        previous = counts.get(previous_key, 0)
+        if previous * (window - elapsed) / window + current > limit:
+            rule_wait = retry_after(previous, current, limit, window, elapsed)
+            wait = rule_wait if wait is None else max(wait, rule_wait)
+    return wait
+
+
+acheck_rate_limit = sync_to_async(check_rate_limit)
+
+
+def acquire_rate_slot(name, rate):
+    """
+    waits for a slot in the rate outbound calls per second every process
+    shares through the cache. Slots are reserved in windows that start
+    after now and the call goes out at its window's start, so calls from
+    different workers are never closer than the rate allows
+    """
+    window = max(1.0, 1 / rate)
+    budget = max(1, round(rate * window))
+    index = int(time.time() // window) + 1
+    while True:
+        key = f"ratelimit:outbound:{name}:{index}"
+        cache.add(key, 0, math.ceil((index + 2) * window - time.time()))
+        try:
+            if cache.incr(key) <= budget:
+                break
+        except ValueError:
+            # expired between add and incr, try the window again
+            continue
+        index += 1
+    delay = index * window - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+
+class SharedCacheRateThrottle(BaseThrottle):
+    """
+    applies the RATE_LIMITS rules named by the view's throttle_scope
+    """
+    def allow_request(self, request, view):
+        self.wait_time = check_rate_limit(view.throttle_scope, request, request.data)
+        return self.wait_time is None
+
+    def wait(self):
+        return self.wait_time
@@ -0,0 +1,44 @@
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+
+VERSION_CLAIM = "ver"
+
+
+class VersionedRefreshToken(RefreshToken):
+    """
+    refresh token carrying the user's token_version, access tokens made
+    from it copy the claim
+    """
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
+
+def check_token_version(user, token):
+    """
+    rejects tokens issued before the user's last revocation, tokens
+    from before versioning count as version 0
+    """
+    if token.get(VERSION_CLAIM, 0) != user.token_version:
+        raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+
+
+class VersionedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = VersionedRefreshToken
+
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    refuses to refresh a revoked token, the user comes from the same
+    cache the authentication uses
+    """
+    token_class = VersionedRefreshToken
+
+    def validate(self, attrs):
+        from .authentication import CachedJWTAuthentication
+
+        CachedJWTAuthentication().get_user(self.token_class(attrs["refresh"]))
+        return super().validate(attrs)
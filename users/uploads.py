@@ -0,0 +1,93 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.utils import timezone
+from django.conf import settings
+
+from .models import ChunkedUpload, Profile
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+def part_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.id}.part")
+
+
+def start_upload(upload):
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+
+
+def write_chunk(upload, stream, length, checksum=None):
+    """
+    writes length bytes from stream at the upload's offset in fixed size
+    blocks so memory stays bounded whatever the chunk size, returns the
+    new offset. A chunk with a checksum is all or nothing, without one
+    whatever arrived before a disconnect is kept for the client to resume
+    """
+    digest = hashlib.sha256()
+    remaining = length
+    with open(part_path(upload), 'r+b') as f:
+        f.seek(upload.offset)
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+            remaining -= len(block)
+        if checksum and (remaining or digest.hexdigest() != checksum.lower()):
+            f.truncate(upload.offset)
+            raise ValueError("Chunk checksum does not match the received bytes.")
+        # drops anything past the new offset left by an earlier failed write
+        f.truncate()
+    return upload.offset + length - remaining
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_upload(upload):
+    """
+    verifies the assembled file against the upload checksum and
+    attaches it to the user's profile
+    """
+    path = part_path(upload)
+    if file_checksum(path) != upload.checksum:
+        raise ValueError("File checksum does not match the uploaded bytes.")
+    profile = Profile.objects.select_related('user').get(user_id=upload.user_id)
+    with open(path, 'rb') as f:
+        profile.document.save(os.path.basename(upload.filename), File(f), save=True)
+    upload.status = "complete"
+    upload.save(update_fields=['status', 'last_updated_time'])
+    os.unlink(path)
+    return profile
+
+
+def discard_upload(upload):
+    try:
+        os.unlink(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def clear_abandoned_uploads():
+    """
+    removes uploads, and their partial files, untouched for longer
+    than CHUNKED_UPLOAD_EXPIRY
+    """
+    cutoff = timezone.now() - settings.CHUNKED_UPLOAD_EXPIRY
+    uploads = ChunkedUpload.objects.filter(last_updated_time__lt=cutoff)
+    deleted = 0
+    for upload in uploads.only('id').iterator():
+        discard_upload(upload)
+        deleted += 1
+    return deleted
@@ -1,21 +1,33 @@
 from django.urls import path
 from .views import *
+from .async_views import *
 
 urlpatterns = [
-    path('register/', RegisterUserApiView.as_view()),
-    path('register/phonenumber/', PhonenumberOTPRegisterApiView.as_view()),
+    path('register/', AsyncRegisterUserApiView.as_view(), name='register'),
+    path('register/phonenumber/', PhonenumberOTPRegisterApiView.as_view(), name='register-phonenumber'),
     
-    path('otp/confirm/', ConfirmOtpAPiView.as_view()),
-    path('otp/resend/', ResendOtpApiView.as_view()),
-    path('otp/set/password/', SetUserPasswordApiView.as_view()),
-    path('otp/phone/resend/', PhonenumberSendOTPApiView.as_view()),
+    path('otp/confirm/', AsyncConfirmOtpApiView.as_view(), name='otp-confirm'),
+    path('otp/resend/', ResendOtpApiView.as_view(), name='otp-resend'),
+    path('otp/set/password/', AsyncSetUserPasswordApiView.as_view(), name='otp-set-password'),
+    path('otp/phone/resend/', PhonenumberSendOTPApiView.as_view(), name='otp-phone-resend'),
     
-    path('user/', UserApiView.as_view()),
-    path('user/password/change/', ChangeUserPasswordApiView.as_view()),
+    path('user/', UserApiView.as_view(), name='user'),
+    path('user/password/change/', ChangeUserPasswordApiView.as_view(), name='user-password-change'),
+    path('user/logout/', LogoutApiView.as_view(), name='user-logout'),
+    path('user/nearby/', NearbyUsersApiView.as_view(), name='user-nearby'),
 
-    path('user/profile/', ProfileApiView.as_view()),
-    path('user/profile/modify/<int:id>/', ProfileModifyApiView.as_view()),
+    path('user/profile/', ProfileApiView.as_view(), name='profile'),
+    path('user/profile/modify/<int:id>/', ProfileModifyApiView.as_view(), name='profile-modify'),
+    path('user/profile/uploads/', ChunkedUploadApiView.as_view(), name='profile-uploads'),
+    path('user/profile/uploads/<uuid:id>/', ChunkedUploadChunkApiView.as_view(), name='profile-upload'),
+    path('user/profile/uploads/<uuid:id>/finalize/', ChunkedUploadFinalizeApiView.as_view(), name='profile-upload-finalize'),
 
-    path('email/check/', EmailCheckApiView.as_view()),
+    path('email/check/', AsyncEmailCheckApiView.as_view(), name='email-check'),
 
-]
\ No newline at end of file
+    path('staff/users/', StaffUserListApiView.as_view(), name='staff-users'),
+    path('staff/profiles/', StaffProfileListApiView.as_view(), name='staff-profiles'),
+
+    path('metrics/', MetricsApiView.as_view(), name='metrics'),
+    path('metrics/slow/', SlowQueriesApiView.as_view(), name='metrics-slow-queries'),
+
+]
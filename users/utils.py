@@ -1,15 +1,182 @@
-import random
+import base64
+import heapq
+import math
+import secrets
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.conf import settings
+from rest_framework.exceptions import APIException
+
+from .models import Otp, Profile, User
+from .index import user_index
+from .geo import bounding_box, covering_cells, haversine
+
+
+class OtpUnavailable(APIException):
+    status_code = 503
+    default_detail = "Could not issue an OTP code, try again shortly."
+    default_code = "otp_unavailable"
 
-from .models import User
 
 def generate_otp():
-    key = random.randint(100001, 999999)
+    key = 100001 + secrets.randbelow(899999)
     return key
 
-def create_user_otp():
-    otp = generate_otp()
-    exists = User.objects.filter(otp_code=otp).exists()
-    if exists:
-        create_user_otp()
-    else:
-        return otp
\ No newline at end of file
+def create_user_otp(user, replace=True):
+    """
+    issues a fresh OTP for a user, replacing any earlier one unless the
+    user was just created and can't have one. Codes that collide with a
+    live one are redrawn up to OTP_MAX_ATTEMPTS times, then
+    OtpUnavailable is raised rather than spinning on a full code space
+    """
+    if replace:
+        Otp.objects.filter(user=user).delete()
+    expiry_time = timezone.now() + settings.OTP_LIFETIME
+    for _ in range(settings.OTP_MAX_ATTEMPTS):
+        otp = generate_otp()
+        try:
+            with transaction.atomic():
+                Otp.objects.create(
+                    code=otp,
+                    user=user,
+                    expiry_time=expiry_time
+                )
+            return otp
+        except IntegrityError:
+            Otp.objects.filter(
+                code=otp, 
+                expiry_time__lte=timezone.now()
+            ).delete()
+    raise OtpUnavailable()
+
+def otp_exists(otp):
+    return Otp.objects.filter(
+        code=otp, 
+        expiry_time__gt=timezone.now()
+    ).exists()
+
+async def aotp_exists(otp):
+    return await Otp.objects.filter(
+        code=otp, 
+        expiry_time__gt=timezone.now()
+    ).aexists()
+
+def consume_user_otp(otp):
+    """
+    returns the user an OTP was issued to and burns the code,
+    None if the code is unknown, expired or already used
+    """
+    try:
+        code = Otp.objects.select_related('user').get(
+            code=otp, 
+            expiry_time__gt=timezone.now()
+        )
+    except Otp.DoesNotExist:
+        return None
+    deleted, _ = Otp.objects.filter(code=code.code, user_id=code.user_id).delete()
+    if not deleted:
+        return None
+    return code.user
+
+async def aconsume_user_otp(otp):
+    """
+    async version of consume_user_otp for the async views
+    """
+    try:
+        code = await Otp.objects.select_related('user').aget(
+            code=otp, 
+            expiry_time__gt=timezone.now()
+        )
+    except Otp.DoesNotExist:
+        return None
+    deleted, _ = await Otp.objects.filter(code=code.code, user_id=code.user_id).adelete()
+    if not deleted:
+        return None
+    return code.user
+
+def clear_expired_otps():
+    deleted, _ = Otp.objects.filter(expiry_time__lte=timezone.now()).delete()
+    return deleted
+
+def email_exists(email):
+    """
+    checks the existence index first and only asks the database when
+    the email might be registered
+    """
+    if not user_index.might_exist("email", email):
+        return False
+    exists = User.objects.filter(email=email).exists()
+    user_index.record(exists)
+    return exists
+
+async def aemail_exists(email):
+    if not await user_index.amight_exist("email", email):
+        return False
+    exists = await User.objects.filter(email=email).aexists()
+    user_index.record(exists)
+    return exists
+
+def phone_number_exists(phone_number):
+    if not user_index.might_exist("phone", phone_number):
+        return False
+    exists = User.objects.filter(phone_number=phone_number).exists()
+    user_index.record(exists)
+    return exists
+
+
+def profile_version(**lookup):
+    """
+    returns (id, last_updated_time, user last_updated_time) of a profile
+    without loading or serializing the row, None if it does not exist
+    """
+    versions = Profile.objects.filter(**lookup).values_list(
+        'id', 'last_updated_time', 'user__last_updated_time'
+    )[:1]
+    return versions[0] if versions else None
+
+
+def nearby_users(latitude, longitude, radius_km, limit, after=None, exclude=None):
+    """
+    (distance, id) of active users within radius_km, closest first.
+    The geohash cells covering the bounding box turn the scan into index
+    ranges, the box trims their corners and haversine gives the exact
+    distance. after is the last (distance, id) of the previous page,
+    returns the page and whether more users follow
+    """
+    box = bounding_box(latitude, longitude, radius_km)
+    min_lat, max_lat, min_lon, max_lon = box
+    cells = Q()
+    for prefix in covering_cells(box):
+        cells |= Q(geohash__gte=prefix, geohash__lt=f"{prefix}~")
+    candidates = User.objects.filter(
+        cells,
+        latitude__range=(min_lat, max_lat),
+        longitude__range=(min_lon, max_lon),
+        is_active=True
+    ).order_by()
+    if exclude is not None:
+        candidates = candidates.exclude(id=exclude)
+    matches = []
+    for id, lat, lon in candidates.values_list('id', 'latitude', 'longitude').iterator(chunk_size=5000):
+        distance = haversine(latitude, longitude, lat, lon)
+        if distance <= radius_km and (after is None or (distance, id) > after):
+            matches.append((distance, id))
+    page = heapq.nsmallest(limit + 1, matches)
+    return page[:limit], len(page) > limit
+
+
+def encode_cursor(distance, id):
+    return base64.urlsafe_b64encode(f"{distance!r}:{id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    raises ValueError for a cursor that was not issued by encode_cursor
+    """
+    distance, id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+    distance = float(distance)
+    if not math.isfinite(distance):
+        raise ValueError(distance)
+    return distance, int(id)
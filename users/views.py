@@ -1,50 +1,68 @@
+import math
+
 from rest_framework.generics import GenericAPIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.contrib.auth import authenticate
+from django.http import HttpResponse
+from django.conf import settings
+from django.utils.cache import quote_etag
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.db import IntegrityError
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
+from django_filters.rest_framework import DjangoFilterBackend
 
 from .serializers import *
+from .services import register_phone_user
+from .filters import ProfileFilter, UserFilter
+from .pagination import KeysetPagination
+from .metrics import registry
+from .throttling import SharedCacheRateThrottle
+from .tokens import VersionedRefreshToken
+from .uploads import discard_upload, finalize_upload, start_upload, write_chunk
+from .utils import create_user_otp, profile_version
+from .utils import decode_cursor, encode_cursor, nearby_users
 
 
-class RegisterUserApiView(GenericAPIView):
-    """
-    registers a user to the platform
-    """
-    serializer_class = RegistrationSerializer
+def user_etag(request, *args, **kwargs):
+    user = request.user
+    return f"user-{user.pk}-{user.last_updated_time.timestamp()}"
 
-    def post(self, request):
-        serializer = self.serializer_class(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            user = User.objects.get(email=serializer.data['email'])
-            data = {
-                "message": "User created successfully",
-                "otp": user.otp_code
-            }
-            return Response(data)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def user_last_modified(request, *args, **kwargs):
+    return request.user.last_updated_time
 
-class ConfirmOtpAPiView(GenericAPIView):
-    """
-    confirms a users OTP
-    """
-    serializer_class = OtpConfirmationSerializer
 
-    def post(self, request):
-        serializer = self.serializer_class(data=request.data)
-        if serializer.is_valid():
-            data = {
-                "message": "OTP code confirmed successfully",
-                "exists": True
-            }
-            return Response(data)
+def get_profile_version(request, id=None):
+    # cached on the request so the etag and last modified lookups share a query
+    if not hasattr(request, '_profile_version'):
+        if id is None:
+            request._profile_version = profile_version(user=request.user)
         else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            request._profile_version = profile_version(id=id)
+    return request._profile_version
+
+
+def build_profile_etag(id, profile_time, user_time):
+    return f"profile-{id}-{profile_time.timestamp()}-{user_time.timestamp()}"
+
+
+def profile_etag(request, *args, **kwargs):
+    version = get_profile_version(request, *args, **kwargs)
+    if version is None:
+        return None
+    return build_profile_etag(*version)
+
+
+def profile_last_modified(request, *args, **kwargs):
+    version = get_profile_version(request, *args, **kwargs)
+    if version is None:
+        return None
+    return max(version[1], version[2])
 
 
 class ResendOtpApiView(GenericAPIView):
@@ -52,16 +70,16 @@ class ResendOtpApiView(GenericAPIView):
     resends a user confirmation OTP
     """
     serializer_class = ResendOtpSerializer
+    throttle_classes = [SharedCacheRateThrottle]
+    throttle_scope = 'otp-resend'
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
             email = request.data['email']
             user = User.objects.get(email=email)
-            otp = create_user_otp()
-            user.otp_code = otp
-            user.save()
-            user.send_otp()
+            otp = create_user_otp(user)
+            user.send_otp(otp)
             data = {
                 "message": "OTP resent to provided email"
             }
@@ -75,20 +93,20 @@ class PhonenumberOTPRegisterApiView(GenericAPIView):
     registes user then sends an OTP code to a users phonenumber
     """
     serializer_class = PhonenumberRegistrationSerializer
+    throttle_classes = [SharedCacheRateThrottle]
+    throttle_scope = 'register-phonenumber'
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
             phone_number = serializer.validated_data['phone_number']
-            otp = create_user_otp()
-            user = User.objects.create(
-                phone_number=phone_number,
-                phone_otp_registration=True,
-                email=f"{phone_number}@forge.com"
-            )
-            user.otp_code = otp
-            user.save()
-            user.send_phonenumber_opt()
+            try:
+                user, otp = register_phone_user(phone_number)
+            except IntegrityError:
+                data = {
+                    "phone_number": ["User with Phonenumber entered already exist."]
+                }
+                return Response(data, status=status.HTTP_400_BAD_REQUEST)
             data = {
                 "message": "OTP sent to provided Phonenumber",
                 "otp": otp
@@ -103,53 +121,18 @@ class PhonenumberSendOTPApiView(GenericAPIView):
     sends otp code to a users phonenumber
     """
     serializer_class = PhonenumberSendOtpSerializer
+    throttle_classes = [SharedCacheRateThrottle]
+    throttle_scope = 'otp-phone-resend'
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['phone_number']
-            otp = create_user_otp()
-            user.otp_code = otp
-            user.save()
-            usr = User.objects.get(phone_number=user.phone_number)
-            sms = usr.send_phonenumber_opt()
-            print(sms)
-            if not sms:
-                data = {
-                    "message": "User created, but error sending OTP, resend OTP to number.",
-                    "errored_otp": otp,
-                }
-            else:
-                data = {
-                    "message": "OTP sent to provided Phonenumber",
-                    "otp": otp
-                }                
-            return Response(data)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-class SetUserPasswordApiView(GenericAPIView):
-    """
-    sets the user password and returns JWT token
-    """
-    serializer_class = SetUserPasswordSerializer
-
-    def post(self, request):
-        serializer = self.serializer_class(data=request.data)
-        if serializer.is_valid():
-            data_dict = serializer.data
-            otp = data_dict['otp_code']
-            password = data_dict['password']
-            user = User.objects.get(otp_code=otp)
-            user.update_user_password(password)
-            refresh_token = RefreshToken.for_user(user)
-            user_serializer = UsersSerializer(user)
+            otp = create_user_otp(user)
+            user.send_phonenumber_opt(otp)
             data = {
-                "message": "Password set successfully",
-                "user": user_serializer.data,
-                "refresh": f"{refresh_token}",
-                "access": f"{refresh_token.access_token}"
+                "message": "OTP sent to provided Phonenumber",
+                "otp": otp
             }
             return Response(data)
         else:
@@ -163,24 +146,26 @@ class UserApiView(GenericAPIView):
     serializer_class = UsersSerializer
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=user_etag, last_modified_func=user_last_modified))
     def get(self, request):
-        user = request.user
-        serializer = self.serializer_class(user)
+        serializer = UserReadSerializer(request.user)
         return Response(serializer.data)
 
+    @method_decorator(condition(etag_func=user_etag, last_modified_func=user_last_modified))
     def patch(self, request):
         user = request.user
         serializer = self.serializer_class(user, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            user = serializer.save()
+            response = Response(UserReadSerializer(user).data)
+            response['ETag'] = quote_etag(user_etag(request))
+            return response
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request):
         user = request.user
-        serializer = UsersSerializer(user)
-        serializer_data = serializer.data
+        serializer_data = UserReadSerializer(user).data
         user.delete()
         data = {
             "message": "Deleted User successfully",
@@ -189,6 +174,56 @@ class UserApiView(GenericAPIView):
         return Response(data)
 
 
+class NearbyUsersApiView(GenericAPIView):
+    """
+    lists active users near the authenticated user, closest first,
+    paginated by the cursor in next
+    """
+    serializer_class = NearbyUserSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.latitude is None or user.longitude is None:
+            data = {
+                "message": "Set a location on the user to find nearby users"
+            }
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            radius = float(request.query_params.get('radius', settings.NEARBY_DEFAULT_RADIUS_KM))
+            # float() accepts nan and inf, which min and max cannot clamp
+            if not math.isfinite(radius):
+                raise ValueError(radius)
+            limit = int(request.query_params.get('limit', settings.NEARBY_PAGE_SIZE))
+            cursor = request.query_params.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            data = {
+                "message": "radius, limit or cursor is invalid"
+            }
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        radius = min(max(radius, 0), settings.NEARBY_MAX_RADIUS_KM)
+        limit = min(max(limit, 1), settings.NEARBY_MAX_PAGE_SIZE)
+
+        page, more = nearby_users(user.latitude, user.longitude, radius, limit, after, exclude=user.id)
+        users = User.objects.in_bulk([id for _, id in page])
+        results = []
+        for distance, id in page:
+            if id in users:
+                users[id].distance = round(distance, 3)
+                results.append(self.serializer_class(users[id]).data)
+        next_url = None
+        if more:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor', encode_cursor(*page[-1])
+            )
+        data = {
+            "next": next_url,
+            "results": results
+        }
+        return Response(data)
+
+
 class ChangeUserPasswordApiView(GenericAPIView):
     """
     changes a user password from current one
@@ -205,10 +240,12 @@ class ChangeUserPasswordApiView(GenericAPIView):
                 password=request.data['old_password']
             )
             if usr is not None:
-                user.set_password(request.data['password'])
-                user.save()
+                user.update_user_password(request.data['password'])
+                refresh_token = VersionedRefreshToken.for_user(user)
                 data = {
-                    'message': 'User password changed successfully'
+                    'message': 'User password changed successfully',
+                    "refresh": f"{refresh_token}",
+                    "access": f"{refresh_token.access_token}"
                 }
                 return Response(data)
             else:
@@ -220,6 +257,21 @@ class ChangeUserPasswordApiView(GenericAPIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
 
+class LogoutApiView(APIView):
+    """
+    revokes every token issued to the user
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        user.revoke_tokens()
+        data = {
+            "message": "Logged out of all sessions"
+        }
+        return Response(data)
+
+
 class ProfileApiView(GenericAPIView):
     """
     gets a users profile
@@ -227,11 +279,19 @@ class ProfileApiView(GenericAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=profile_etag, last_modified_func=profile_last_modified))
     def get(self, request):
-        profile = Profile.objects.filter(
-            user=request.user
-        ).first()
-        serializer = self.serializer_class(profile)
+        # the authenticated user is already loaded, attach it instead of
+        # joining it back in
+        try:
+            profile = Profile.objects.get(user=request.user)
+        except Profile.DoesNotExist:
+            data = {
+                "message": "No Profile found for user"
+            }
+            return Response(data, status=status.HTTP_404_NOT_FOUND)
+        profile.user = request.user
+        serializer = ProfileReadSerializer(profile)
         return Response(serializer.data)
     
 
@@ -242,35 +302,221 @@ class ProfileModifyApiView(GenericAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=profile_etag, last_modified_func=profile_last_modified))
     def patch(self, request, id):
-        profile = Profile.objects.filter(id=id).first()
-        if profile is None:
+        try:
+            profile = Profile.objects.select_related('user').get(id=id)
+        except Profile.DoesNotExist:
             data = {
                 "message": f"No Profile Service object found with id {id}"
             }
             return Response(data, status=status.HTTP_404_NOT_FOUND)
         serializer = self.serializer_class(profile, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            profile = serializer.save()
+            response = Response(ProfileReadSerializer(profile).data)
+            response['ETag'] = quote_etag(build_profile_etag(
+                profile.id, profile.last_updated_time, profile.user.last_updated_time
+            ))
+            return response
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EmailCheckApiView(GenericAPIView):
+class ChunkedUploadApiView(GenericAPIView):
     """
-    checks if an email exist
+    starts a resumable upload of a profile document
     """
-    serializer_class = EmailCheckSerializer
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
 
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         if serializer.is_valid():
-            exists = User.objects.filter(email=request.data['email']).exists()
+            upload = serializer.save(user=request.user)
+            start_upload(upload)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        else:
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ChunkedUploadChunkApiView(GenericAPIView):
+    """
+    reports the received offset of an upload, accepts the raw chunk
+    starting at Upload-Offset, or aborts the upload
+    """
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_upload(self, request, id):
+        return ChunkedUpload.objects.filter(id=id, user=request.user).first()
+
+    def not_found(self, id):
+        data = {
+            "message": f"No upload found with id {id}"
+        }
+        return Response(data, status=status.HTTP_404_NOT_FOUND)
+
+    def get(self, request, id):
+        upload = self.get_upload(request, id)
+        if upload is None:
+            return self.not_found(id)
+        response = Response(self.serializer_class(upload).data)
+        response['Upload-Offset'] = upload.offset
+        return response
+
+    def put(self, request, id):
+        upload = self.get_upload(request, id)
+        if upload is None:
+            return self.not_found(id)
+        if upload.status != "pending":
             data = {
-                "message": "Email Confirmed Successfully",
-                "exists": exists
+                "message": "Upload is already complete"
             }
-            return Response(data)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response(data, status=status.HTTP_409_CONFLICT)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            data = {
+                "message": "Upload-Offset and Content-Length headers are required"
+            }
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        if offset != upload.offset:
+            data = {
+                "message": "Upload-Offset does not match the received bytes",
+                "offset": upload.offset
+            }
+            return Response(data, status=status.HTTP_409_CONFLICT)
+        if length > settings.CHUNKED_UPLOAD_MAX_CHUNK or offset + length > upload.size:
+            data = {
+                "message": "Chunk is larger than allowed or runs past the upload size"
+            }
+            return Response(data, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            new_offset = write_chunk(
+                upload,
+                request.stream,
+                length,
+                request.headers.get('Upload-Checksum')
+            )
+        except ValueError as e:
+            data = {
+                "message": f"{e}",
+                "offset": upload.offset
+            }
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        # a concurrent chunk for the same offset loses, the final
+        # checksum catches any bytes it managed to interleave
+        updated = ChunkedUpload.objects.filter(id=upload.id, offset=offset).update(
+            offset=new_offset,
+            last_updated_time=timezone.now()
+        )
+        if not updated:
+            upload.refresh_from_db(fields=['offset'])
+            data = {
+                "message": "Upload-Offset does not match the received bytes",
+                "offset": upload.offset
+            }
+            return Response(data, status=status.HTTP_409_CONFLICT)
+        response = Response({"offset": new_offset, "size": upload.size})
+        response['Upload-Offset'] = new_offset
+        return response
+
+    def delete(self, request, id):
+        upload = self.get_upload(request, id)
+        if upload is None:
+            return self.not_found(id)
+        discard_upload(upload)
+        data = {
+            "message": "Upload aborted"
+        }
+        return Response(data)
+
+
+class ChunkedUploadFinalizeApiView(GenericAPIView):
+    """
+    verifies a fully received upload and attaches it as the profile document
+    """
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        upload = ChunkedUpload.objects.filter(id=id, user=request.user, status="pending").first()
+        if upload is None:
+            data = {
+                "message": f"No pending upload found with id {id}"
+            }
+            return Response(data, status=status.HTTP_404_NOT_FOUND)
+        if upload.offset != upload.size:
+            data = {
+                "message": "Upload is incomplete",
+                "offset": upload.offset
+            }
+            return Response(data, status=status.HTTP_409_CONFLICT)
+        try:
+            profile = finalize_upload(upload)
+        except ValueError as e:
+            discard_upload(upload)
+            data = {
+                "message": f"{e}"
+            }
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ProfileReadSerializer(profile).data)
+
+
+class StaffUserListApiView(GenericAPIView):
+    """
+    lists users newest first for staff, keyset paginated and filterable
+    """
+    serializer_class = UserReadSerializer
+    permission_classes = [IsAdminUser]
+    queryset = User.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = UserFilter
+    pagination_class = KeysetPagination
+
+    def get(self, request):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class StaffProfileListApiView(GenericAPIView):
+    """
+    lists profiles newest first for staff, keyset paginated and filterable
+    """
+    serializer_class = ProfileReadSerializer
+    permission_classes = [IsAdminUser]
+    queryset = Profile.objects.select_related('user')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProfileFilter
+    pagination_class = KeysetPagination
+
+    def get(self, request):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        serializer = self.serializer_class(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class MetricsApiView(APIView):
+    """
+    exposes per route request metrics in Prometheus text format
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
+
+
+class SlowQueriesApiView(APIView):
+    """
+    lists the sampled slow queries kept in memory
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(list(registry.slow_queries))